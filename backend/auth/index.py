@@ -1,7 +1,10 @@
+import functools
 import json
+import re
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+import hmac
+import base64
 import hashlib
 import secrets
 
@@ -13,10 +16,264 @@ def verify_password(password: str, hashed: str) -> bool:
     """Проверка пароля"""
     return hash_password(password) == hashed
 
+psycopg2 = None
+
+def load_db_driver():
+    """Ленивый импорт psycopg2: preflight и ранние 4xx-ответы обходятся без драйвера"""
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2.extras
+        import psycopg2.pool
+
+DB_POOL_MAXCONN = int(os.environ.get('DB_POOL_MAXCONN', '4'))
+DB_POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+_pool = None
+_last_used = {}
+_pool_stats = {
+    'checkouts': 0, 'opened': 0, 'reused': 0, 'reconnects': 0, 'discarded': 0, 'exhausted': 0,
+    'in_use': 0, 'peak_in_use': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0
+}
+
+def _get_pool():
+    """Пул соединений уровня модуля, переживающий тёплые вызовы функции"""
+    global _pool
+    load_db_driver()
+    if _pool is None or _pool.closed:
+        options = {'connection_factory': _timed_connection_class()} if REQUEST_TIMING else {}
+        _pool = psycopg2.pool.ThreadedConnectionPool(1, DB_POOL_MAXCONN, os.environ['DATABASE_URL'], **options)
+        _last_used.clear()
+    return _pool
+
+def _is_connection_alive(conn) -> bool:
+    """Проверка соединения: дешёвая по статусу, SELECT 1 только после долгого простоя"""
+    if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_PING_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as ping:
+            ping.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _discard_connection(pool, conn):
+    _last_used.pop(id(conn), None)
+    _pool_stats['discarded'] += 1
+    pool.putconn(conn, close=True)
+
 def get_db_connection():
-    """Получение подключения к базе данных"""
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    """Получение живого подключения из пула с переподключением при обрыве"""
+    if _request_timing is None:
+        return _checkout_connection()
+    started = time.perf_counter()
+    _request_timing['connecting'] = True
+    try:
+        return _checkout_connection()
+    finally:
+        _request_timing['connecting'] = False
+        timing_add('connect', time.perf_counter() - started)
+
+def _checkout_connection():
+    pool = _get_pool()
+    _pool_stats['checkouts'] += 1
+    started = time.perf_counter()
+    try:
+        conn = _take_live_connection(pool)
+    except psycopg2.pool.PoolError:
+        _pool_stats['exhausted'] += 1
+        print(json.dumps({'event': 'pool_exhausted', 'function': 'auth', 'pool': get_pool_stats()}))
+        raise
+    waited_ms = (time.perf_counter() - started) * 1000
+    _pool_stats['wait_ms_total'] += waited_ms
+    _pool_stats['wait_ms_max'] = max(_pool_stats['wait_ms_max'], waited_ms)
+    _pool_stats['in_use'] += 1
+    _pool_stats['peak_in_use'] = max(_pool_stats['peak_in_use'], _pool_stats['in_use'])
+    return conn
+
+def _take_live_connection(pool):
+    while True:
+        conn = pool.getconn()
+        if id(conn) not in _last_used:
+            _pool_stats['opened'] += 1
+            return conn
+        if _is_connection_alive(conn):
+            _pool_stats['reused'] += 1
+            return conn
+        _discard_connection(pool, conn)
+        _pool_stats['reconnects'] += 1
+
+def release_db_connection(conn):
+    """Откат незавершённой транзакции и возврат подключения в пул"""
+    pool = _get_pool()
+    _pool_stats['in_use'] = max(_pool_stats['in_use'] - 1, 0)
+    try:
+        if not conn.closed:
+            conn.rollback()
+    except psycopg2.Error:
+        pass
+    if conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        _discard_connection(pool, conn)
+        return
+    _last_used[id(conn)] = time.monotonic()
+    pool.putconn(conn)
+    if conn.closed:
+        _last_used.pop(id(conn), None)
+
+def get_pool_stats() -> dict:
+    """
+    Статистика пула по счётчикам get_db_connection/release_db_connection с момента холодного старта.
+    Попадает в строку лога запроса (REQUEST_TIMING) и в лог pool_exhausted.
+    """
+    stats = dict(_pool_stats)
+    stats['wait_ms_total'] = round(stats['wait_ms_total'], 1)
+    stats['wait_ms_max'] = round(stats['wait_ms_max'], 1)
+    stats['max'] = DB_POOL_MAXCONN
+    return stats
+
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+
+_request_timing = None
+_timed_connection = None
+
+def timing_add(phase: str, seconds: float):
+    """Добавляет время к фазе текущего запроса; без REQUEST_TIMING ничего не делает"""
+    if _request_timing is not None:
+        phases = _request_timing['phases']
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+def redact_sql(query) -> str:
+    """Текст запроса в одну строку без строковых литералов (execute_values подставляет значения в текст)"""
+    text = query.decode(errors='replace') if isinstance(query, bytes) else str(query)
+    return SQL_LITERAL_RE.sub("'?'", ' '.join(text.split()))[:2000]
+
+def redact_params(params):
+    """Вместо значений параметров - только их типы и размеры"""
+    if params is None:
+        return None
+    values = params.values() if isinstance(params, dict) else params
+    return [
+        f'{type(value).__name__}[{len(value)}]' if isinstance(value, (list, tuple)) else type(value).__name__
+        for value in values
+    ]
+
+def record_query(query, params, seconds: float, rowcount: int):
+    """Учёт запроса в статистике текущего запроса и лог медленного SQL"""
+    if _request_timing is None:
+        return
+    if not _request_timing['connecting']:
+        timing_add('db', seconds)
+    _request_timing['queries'] += 1
+    _request_timing['rows'] += max(rowcount, 0)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        print(json.dumps({
+            'event': 'slow_query',
+            'function': 'auth',
+            'ms': round(seconds * 1000, 1),
+            'sql': redact_sql(query),
+            'params': redact_params(params)
+        }))
+
+def _timed_connection_class():
+    """Класс соединения, курсоры которого замеряют каждый execute; создаётся только при включённом REQUEST_TIMING"""
+    global _timed_connection
+    if _timed_connection is None:
+        cursor_classes = {}
+        
+        class TimedConnection(psycopg2.extensions.connection):
+            def cursor(self, *args, **kwargs):
+                factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+                if factory not in cursor_classes:
+                    def execute(cursor, query, params=None, _execute=factory.execute):
+                        started = time.perf_counter()
+                        try:
+                            return _execute(cursor, query, params)
+                        finally:
+                            record_query(query, params, time.perf_counter() - started, cursor.rowcount)
+                    cursor_classes[factory] = type(f'Timed{factory.__name__}', (factory,), {'execute': execute})
+                kwargs['cursor_factory'] = cursor_classes[factory]
+                return super().cursor(*args, **kwargs)
+        
+        _timed_connection = TimedConnection
+    return _timed_connection
+
+def timed_handler(handle):
+    """
+    Замер фаз запроса (connect, db, serialize, compress, остальное - app): заголовок Server-Timing
+    и одна JSON-строка лога на запрос. Без REQUEST_TIMING вызывает handler напрямую.
+    """
+    @functools.wraps(handle)
+    def wrapper(event: dict, context) -> dict:
+        global _request_timing
+        if not REQUEST_TIMING:
+            return handle(event, context)
+        
+        _request_timing = {'phases': {}, 'queries': 0, 'rows': 0, 'connecting': False}
+        started = time.perf_counter()
+        try:
+            response = handle(event, context)
+        finally:
+            timing, _request_timing = _request_timing, None
+        total = time.perf_counter() - started
+        
+        phases = {name: round(seconds * 1000, 1) for name, seconds in timing['phases'].items()}
+        phases['app'] = round(max(total - sum(timing['phases'].values()), 0) * 1000, 1)
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={ms}' for name, ms in phases.items()] + [f'total;dur={total * 1000:.1f}']
+        )
+        headers['Timing-Allow-Origin'] = '*'
+        print(json.dumps({
+            'event': 'request',
+            'function': 'auth',
+            'method': event.get('httpMethod'),
+            'status': response.get('statusCode'),
+            'ms': round(total * 1000, 1),
+            'phases': phases,
+            'queries': timing['queries'],
+            'rows': timing['rows'],
+            'bytes': len(response.get('body') or ''),
+            'pool': get_pool_stats()
+        }))
+        return response
+    return wrapper
 
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', '86400'))
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def verify_session_token(token: str):
+    """Проверка подписи и срока действия токена без обращения к базе, None если токен недействителен"""
+    payload, _, signature = token.partition('.')
+    if not SESSION_SECRET or not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+def issue_session_token(user_id: int, role: str) -> str:
+    """Компактный токен сессии, подписанный HMAC-SHA256: id пользователя, роль и срок действия"""
+    claims = {'uid': user_id, 'role': role, 'exp': int(time.time()) + SESSION_TTL_SECONDS, 'jti': secrets.token_hex(8)}
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{payload}.{_sign(payload)}'
+
+@timed_handler
 def handler(event: dict, context) -> dict:
     """
     API для аутентификации пользователей.
@@ -46,14 +303,15 @@ def handler(event: dict, context) -> dict:
         body = json.loads(event.get('body', '{}'))
         action = body.get('action')
         
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
+        # Подключение к базе берётся только после проверки тела запроса: ответы 400/401 обходятся без драйвера
         if action == 'register':
             email = body.get('email', '').strip().lower()
             password = body.get('password', '')
             name = body.get('name', '')
             role = body.get('role', 'user')
+            # Роль модератора через регистрацию не выдаётся: она попадает в токен сессии
+            if role in ('admin', 'moderator'):
+                role = 'user'
             
             if not email or not password or not name:
                 return {
@@ -62,6 +320,9 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'Email, password and name are required'})
                 }
             
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
             # Проверка существования пользователя
             cur.execute("SELECT id FROM users WHERE email = %s", (email,))
             if cur.fetchone():
@@ -88,10 +349,14 @@ def handler(event: dict, context) -> dict:
                 'balance': float(user_data['balance'])
             }
             
+            response = {'success': True, 'user': user}
+            if SESSION_SECRET:
+                response['token'] = issue_session_token(user['id'], user['role'])
+            
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'user': user})
+                'body': json.dumps(response)
             }
         
         elif action == 'login':
@@ -105,6 +370,9 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'Email and password are required'})
                 }
             
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
             # Поиск пользователя
             cur.execute("SELECT id, email, password, name, role, balance FROM users WHERE email = %s", (email,))
             user_data = cur.fetchone()
@@ -124,10 +392,14 @@ def handler(event: dict, context) -> dict:
                 'balance': float(user_data['balance'])
             }
             
+            response = {'success': True, 'user': user}
+            if SESSION_SECRET:
+                response['token'] = issue_session_token(user['id'], user['role'])
+            
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'user': user})
+                'body': json.dumps(response)
             }
         
         elif action == 'change_email':
@@ -142,6 +414,9 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'User ID, current password and new email are required'})
                 }
             
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
             # Проверка текущего пароля
             cur.execute("SELECT password FROM users WHERE id = %s", (user_id,))
             user_data = cur.fetchone()
@@ -183,6 +458,9 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'User ID, current password and new password are required'})
                 }
             
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
             # Проверка текущего пароля
             cur.execute("SELECT password FROM users WHERE id = %s", (user_id,))
             user_data = cur.fetchone()
@@ -215,6 +493,9 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'Email and new password are required'})
                 }
             
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
             # Проверка существования пользователя
             cur.execute("SELECT id FROM users WHERE email = %s", (email,))
             if not cur.fetchone():
@@ -235,6 +516,33 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'success': True, 'message': 'Password updated successfully'})
             }
         
+        elif action == 'logout':
+            claims = verify_session_token(body.get('token', ''))
+            
+            if not claims:
+                return {
+                    'statusCode': 401,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid or expired session token'})
+                }
+            
+            conn = get_db_connection()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            
+            # Токен попадает в deny-list до истечения срока действия
+            cur.execute(
+                """INSERT INTO t_p4903350_kedoo_music_distribu.revoked_tokens (jti, user_id, expires_at)
+                VALUES (%s, %s, to_timestamp(%s)::timestamp) ON CONFLICT (jti) DO NOTHING""",
+                (claims['jti'], claims['uid'], claims['exp'])
+            )
+            conn.commit()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'message': 'Logged out'})
+            }
+        
         else:
             return {
                 'statusCode': 400,
@@ -252,4 +560,4 @@ def handler(event: dict, context) -> dict:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_db_connection(conn)
\ No newline at end of file
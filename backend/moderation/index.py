@@ -1,8 +1,811 @@
+import csv
+import io
+import functools
 import json
+import re
+import select
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+import hmac
+import hashlib
+import gzip
+import base64
+import tempfile
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+psycopg2 = None
+
+def load_db_driver():
+    """Ленивый импорт psycopg2: preflight и ранние 4xx-ответы обходятся без драйвера"""
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2.extras
+        import psycopg2.pool
+
+DB_POOL_MAXCONN = int(os.environ.get('DB_POOL_MAXCONN', '4'))
+DB_POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+_pool = None
+_last_used = {}
+_pool_stats = {
+    'checkouts': 0, 'opened': 0, 'reused': 0, 'reconnects': 0, 'discarded': 0, 'exhausted': 0,
+    'in_use': 0, 'peak_in_use': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0
+}
+
+def _get_pool():
+    """Пул соединений уровня модуля, переживающий тёплые вызовы функции"""
+    global _pool
+    load_db_driver()
+    if _pool is None or _pool.closed:
+        options = {'connection_factory': _timed_connection_class()} if REQUEST_TIMING else {}
+        _pool = psycopg2.pool.ThreadedConnectionPool(1, DB_POOL_MAXCONN, os.environ['DATABASE_URL'], **options)
+        _last_used.clear()
+    return _pool
+
+def _is_connection_alive(conn) -> bool:
+    """Проверка соединения: дешёвая по статусу, SELECT 1 только после долгого простоя"""
+    if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_PING_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as ping:
+            ping.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _discard_connection(pool, conn):
+    _last_used.pop(id(conn), None)
+    _pool_stats['discarded'] += 1
+    pool.putconn(conn, close=True)
+
+def get_db_connection():
+    """Получение живого подключения из пула с переподключением при обрыве"""
+    if _request_timing is None:
+        return _checkout_connection()
+    started = time.perf_counter()
+    _request_timing['connecting'] = True
+    try:
+        return _checkout_connection()
+    finally:
+        _request_timing['connecting'] = False
+        timing_add('connect', time.perf_counter() - started)
+
+def _checkout_connection():
+    pool = _get_pool()
+    _pool_stats['checkouts'] += 1
+    started = time.perf_counter()
+    try:
+        conn = _take_live_connection(pool)
+    except psycopg2.pool.PoolError:
+        _pool_stats['exhausted'] += 1
+        print(json.dumps({'event': 'pool_exhausted', 'function': 'moderation', 'pool': get_pool_stats()}))
+        raise
+    waited_ms = (time.perf_counter() - started) * 1000
+    _pool_stats['wait_ms_total'] += waited_ms
+    _pool_stats['wait_ms_max'] = max(_pool_stats['wait_ms_max'], waited_ms)
+    _pool_stats['in_use'] += 1
+    _pool_stats['peak_in_use'] = max(_pool_stats['peak_in_use'], _pool_stats['in_use'])
+    return conn
+
+def _take_live_connection(pool):
+    while True:
+        conn = pool.getconn()
+        if id(conn) not in _last_used:
+            _pool_stats['opened'] += 1
+            return conn
+        if _is_connection_alive(conn):
+            _pool_stats['reused'] += 1
+            return conn
+        _discard_connection(pool, conn)
+        _pool_stats['reconnects'] += 1
+
+def release_db_connection(conn):
+    """Откат незавершённой транзакции и возврат подключения в пул"""
+    pool = _get_pool()
+    _pool_stats['in_use'] = max(_pool_stats['in_use'] - 1, 0)
+    try:
+        if not conn.closed:
+            conn.rollback()
+    except psycopg2.Error:
+        pass
+    if conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        _discard_connection(pool, conn)
+        return
+    _last_used[id(conn)] = time.monotonic()
+    pool.putconn(conn)
+    if conn.closed:
+        _last_used.pop(id(conn), None)
+
+def get_pool_stats() -> dict:
+    """
+    Статистика пула по счётчикам get_db_connection/release_db_connection с момента холодного старта.
+    Попадает в строку лога запроса (REQUEST_TIMING) и в лог pool_exhausted.
+    """
+    stats = dict(_pool_stats)
+    stats['wait_ms_total'] = round(stats['wait_ms_total'], 1)
+    stats['wait_ms_max'] = round(stats['wait_ms_max'], 1)
+    stats['max'] = DB_POOL_MAXCONN
+    return stats
+
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+
+_request_timing = None
+_timed_connection = None
+
+def timing_add(phase: str, seconds: float):
+    """Добавляет время к фазе текущего запроса; без REQUEST_TIMING ничего не делает"""
+    if _request_timing is not None:
+        phases = _request_timing['phases']
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+def redact_sql(query) -> str:
+    """Текст запроса в одну строку без строковых литералов (execute_values подставляет значения в текст)"""
+    text = query.decode(errors='replace') if isinstance(query, bytes) else str(query)
+    return SQL_LITERAL_RE.sub("'?'", ' '.join(text.split()))[:2000]
+
+def redact_params(params):
+    """Вместо значений параметров - только их типы и размеры"""
+    if params is None:
+        return None
+    values = params.values() if isinstance(params, dict) else params
+    return [
+        f'{type(value).__name__}[{len(value)}]' if isinstance(value, (list, tuple)) else type(value).__name__
+        for value in values
+    ]
+
+def record_query(query, params, seconds: float, rowcount: int):
+    """Учёт запроса в статистике текущего запроса и лог медленного SQL"""
+    if _request_timing is None:
+        return
+    if not _request_timing['connecting']:
+        timing_add('db', seconds)
+    _request_timing['queries'] += 1
+    _request_timing['rows'] += max(rowcount, 0)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        print(json.dumps({
+            'event': 'slow_query',
+            'function': 'moderation',
+            'ms': round(seconds * 1000, 1),
+            'sql': redact_sql(query),
+            'params': redact_params(params)
+        }))
+
+def _timed_connection_class():
+    """Класс соединения, курсоры которого замеряют каждый execute; создаётся только при включённом REQUEST_TIMING"""
+    global _timed_connection
+    if _timed_connection is None:
+        cursor_classes = {}
+        
+        class TimedConnection(psycopg2.extensions.connection):
+            def cursor(self, *args, **kwargs):
+                factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+                if factory not in cursor_classes:
+                    def execute(cursor, query, params=None, _execute=factory.execute):
+                        started = time.perf_counter()
+                        try:
+                            return _execute(cursor, query, params)
+                        finally:
+                            record_query(query, params, time.perf_counter() - started, cursor.rowcount)
+                    cursor_classes[factory] = type(f'Timed{factory.__name__}', (factory,), {'execute': execute})
+                kwargs['cursor_factory'] = cursor_classes[factory]
+                return super().cursor(*args, **kwargs)
+        
+        _timed_connection = TimedConnection
+    return _timed_connection
+
+def timed_handler(handle):
+    """
+    Замер фаз запроса (connect, db, serialize, compress, остальное - app): заголовок Server-Timing
+    и одна JSON-строка лога на запрос. Без REQUEST_TIMING вызывает handler напрямую.
+    """
+    @functools.wraps(handle)
+    def wrapper(event: dict, context) -> dict:
+        global _request_timing
+        if not REQUEST_TIMING:
+            return handle(event, context)
+        
+        _request_timing = {'phases': {}, 'queries': 0, 'rows': 0, 'connecting': False}
+        started = time.perf_counter()
+        try:
+            response = handle(event, context)
+        finally:
+            timing, _request_timing = _request_timing, None
+        total = time.perf_counter() - started
+        
+        phases = {name: round(seconds * 1000, 1) for name, seconds in timing['phases'].items()}
+        phases['app'] = round(max(total - sum(timing['phases'].values()), 0) * 1000, 1)
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={ms}' for name, ms in phases.items()] + [f'total;dur={total * 1000:.1f}']
+        )
+        headers['Timing-Allow-Origin'] = '*'
+        print(json.dumps({
+            'event': 'request',
+            'function': 'moderation',
+            'method': event.get('httpMethod'),
+            'status': response.get('statusCode'),
+            'ms': round(total * 1000, 1),
+            'phases': phases,
+            'queries': timing['queries'],
+            'rows': timing['rows'],
+            'bytes': len(response.get('body') or ''),
+            'pool': get_pool_stats()
+        }))
+        return response
+    return wrapper
+
+def json_default(value):
+    """Хук json.dumps: даты и время в ISO 8601, Decimal в число"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def serialize(payload) -> str:
+    """json.dumps тела ответа через json_default; время попадает в фазу serialize"""
+    if _request_timing is None:
+        return json.dumps(payload, default=json_default)
+    started = time.perf_counter()
+    body = json.dumps(payload, default=json_default)
+    timing_add('serialize', time.perf_counter() - started)
+    return body
+
+def serialize_rows(key: str, row_texts: list, **fields) -> str:
+    """
+    Тело ответа со списком строк, которые PostgreSQL уже собрал в JSON через row_to_json:
+    Python не разбирает и не кодирует их заново, а только склеивает текст; остальные поля через json_default.
+    """
+    started = time.perf_counter()
+    body = '{' + json.dumps(key) + ': [' + ','.join(row_texts) + ']'
+    if fields:
+        body += ', ' + json.dumps(fields, default=json_default)[1:-1]
+    body += '}'
+    timing_add('serialize', time.perf_counter() - started)
+    return body
+
+TRACKS_JSON_SQL = '''
+    SELECT json_agg(
+        json_build_object(
+            'id', t.id,
+            'title', t.title,
+            'audio_url', t.audio_url,
+            'tiktok_moment', t.tiktok_moment,
+            'music_author', t.music_author,
+            'lyrics_author', t.lyrics_author,
+            'has_explicit', t.has_explicit,
+            'performers', t.performers,
+            'producers', t.producers,
+            'isrc', t.isrc,
+            'language', t.language,
+            'track_order', t.track_order,
+            'lyrics', t.lyrics,
+            'is_instrumental', t.is_instrumental
+        ) ORDER BY t.track_order
+    )
+    FROM t_p4903350_kedoo_music_distribu.tracks t
+    WHERE t.release_id = p.id
+'''
+
+RELEASE_COLUMNS_SQL = '''
+    p.id, p.user_id, p.title, p.upc, p.genre, p.cover_url, p.old_release_date, p.new_release_date,
+    p.status, p.rejection_reason, p.created_at, p.updated_at, p.trash_status, p.claimed_by, p.claim_expires_at
+'''
+
+TRACK_COUNT_SQL = '''
+    SELECT count(*) FROM t_p4903350_kedoo_music_distribu.tracks t WHERE t.release_id = p.id
+'''
+
+DETAIL_MAX_IDS = int(os.environ.get('DETAIL_MAX_IDS', '100'))
+
+def parse_release_ids(raw: str) -> list:
+    """Разбор списка id релизов вида '1,2,3', ValueError при некорректном значении"""
+    ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    if not ids or len(ids) > DETAIL_MAX_IDS:
+        raise ValueError('Invalid release ids')
+    return ids
+
+CLAIM_BATCH_SIZE = int(os.environ.get('CLAIM_BATCH_SIZE', '10'))
+CLAIM_MAX_BATCH_SIZE = int(os.environ.get('CLAIM_MAX_BATCH_SIZE', '50'))
+CLAIM_LEASE_SECONDS = int(os.environ.get('CLAIM_LEASE_SECONDS', '600'))
+
+def claim_conflict_response(cursor, release_id) -> dict:
+    """Ответ, когда решение по релизу не применено: релиза нет или он взят другим модератором"""
+    cursor.execute('''
+        SELECT claimed_by FROM t_p4903350_kedoo_music_distribu.releases WHERE id = %s
+    ''', (release_id,))
+    if cursor.fetchone() is None:
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Release not found'})
+        }
+    return {
+        'statusCode': 409,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Release is claimed by another moderator'})
+    }
+
+BULK_MAX_RELEASES = int(os.environ.get('BULK_MAX_RELEASES', '1000'))
+
+def bulk_moderate(cursor, moderator_id: int, status: str, release_ids: list, reasons: list) -> list:
+    """Одним запросом меняет статус pending-релизов и возвращает итог по каждому id"""
+    cursor.execute('''
+        WITH input AS (
+            SELECT * FROM unnest(%s::integer[], %s::text[]) AS i(id, reason)
+        ), updated AS (
+            UPDATE t_p4903350_kedoo_music_distribu.releases r
+            SET status = %s, rejection_reason = i.reason, updated_at = NOW(),
+                claimed_by = NULL, claim_expires_at = NULL
+            FROM input i
+            WHERE r.id = i.id AND r.status = 'pending'
+              AND (r.claimed_by IS NULL OR r.claimed_by = %s OR r.claim_expires_at < NOW())
+            RETURNING r.id
+        )
+        SELECT i.id,
+               CASE
+                   WHEN u.id IS NOT NULL THEN %s
+                   WHEN r.id IS NULL THEN 'not_found'
+                   WHEN r.status <> 'pending' THEN 'already_moderated'
+                   ELSE 'claimed'
+               END as outcome
+        FROM input i
+        LEFT JOIN updated u ON u.id = i.id
+        LEFT JOIN t_p4903350_kedoo_music_distribu.releases r ON r.id = i.id
+    ''', (release_ids, reasons, status, moderator_id, status))
+    return [{'release_id': row['id'], 'outcome': row['outcome']} for row in cursor.fetchall()]
+
+DUPLICATE_CHECK_MAX_CODES = int(os.environ.get('DUPLICATE_CHECK_MAX_CODES', '1000'))
+
+def find_duplicate_codes(cursor, upcs: list, isrcs: list, exclude_release_id=None) -> list:
+    """
+    Одним запросом ищет активные релизы с такими же UPC или треки с такими же ISRC.
+    Коды сравниваются в нормализованном виде по индексам normalize_upc/normalize_isrc.
+    """
+    if not upcs and not isrcs:
+        return []
+    cursor.execute('''
+        WITH upcs AS (
+            SELECT DISTINCT code, t_p4903350_kedoo_music_distribu.normalize_upc(code) as normalized
+            FROM unnest(%s::text[]) AS code
+        ), isrcs AS (
+            SELECT DISTINCT code, t_p4903350_kedoo_music_distribu.normalize_isrc(code) as normalized
+            FROM unnest(%s::text[]) AS code
+        )
+        SELECT 'upc' as kind, u.code, r.id as release_id, r.user_id, r.title, r.status, NULL::integer as track_id
+        FROM upcs u
+        JOIN t_p4903350_kedoo_music_distribu.releases r
+          ON t_p4903350_kedoo_music_distribu.normalize_upc(r.upc) = u.normalized AND r.trash_status IS NULL
+        WHERE r.id IS DISTINCT FROM %s
+        UNION ALL
+        SELECT 'isrc' as kind, i.code, r.id as release_id, r.user_id, r.title, r.status, t.id as track_id
+        FROM isrcs i
+        JOIN t_p4903350_kedoo_music_distribu.tracks t
+          ON t_p4903350_kedoo_music_distribu.normalize_isrc(t.isrc) = i.normalized
+        JOIN t_p4903350_kedoo_music_distribu.releases r ON r.id = t.release_id AND r.trash_status IS NULL
+        WHERE r.id IS DISTINCT FROM %s
+    ''', (upcs, isrcs, exclude_release_id, exclude_release_id))
+    return cursor.fetchall()
+
+def release_codes(release: dict) -> tuple:
+    """UPC релиза и ISRC его треков для проверки на дубликаты"""
+    upcs = [release['upc']] if release.get('upc') else []
+    isrcs = [track['isrc'] for track in release.get('tracks') or [] if isinstance(track, dict) and track.get('isrc')]
+    return upcs, isrcs
+
+def find_batch_duplicates(cursor, codes_by_release: dict) -> dict:
+    """
+    Проверка пачки релизов одним запросом: коды всех релизов ищутся вместе,
+    затем совпадения раскладываются по релизам, которым принадлежит код.
+    """
+    upcs = sorted({code for release_upcs, _ in codes_by_release.values() for code in release_upcs})
+    isrcs = sorted({code for _, release_isrcs in codes_by_release.values() for code in release_isrcs})
+    rows_by_code = {}
+    for row in find_duplicate_codes(cursor, upcs, isrcs):
+        rows_by_code.setdefault((row['kind'], row['code']), []).append(row)
+    
+    duplicates = {}
+    for release_id, (release_upcs, release_isrcs) in codes_by_release.items():
+        codes = [('upc', code) for code in release_upcs] + [('isrc', code) for code in dict.fromkeys(release_isrcs)]
+        duplicates[release_id] = [
+            row for code in codes for row in rows_by_code.get(code, ()) if row['release_id'] != release_id
+        ]
+    return duplicates
+
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '20'))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', '100'))
+SEARCH_UPC_RE = re.compile(r'^\d{8,14}$')
+SEARCH_ISRC_RE = re.compile(r'^[A-Z]{2}[A-Z0-9]{3}\d{7}$')
+
+def encode_search_cursor(rank: float, release_id: int) -> str:
+    """Курсор страницы поиска: ранг и id последнего релиза"""
+    raw = json.dumps([rank, release_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_search_cursor(cursor: str) -> tuple:
+    """Разбор курсора поиска, ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        rank, release_id = json.loads(raw)
+        return float(rank), int(release_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def search_releases(cursor, query: str, limit: int, after=None, user_id=None, status=None) -> list:
+    """
+    Поиск по каталогу: UPC и ISRC ищутся точным совпадением по индексам,
+    остальное - полнотекстово по search_vector с ранжированием ts_rank.
+    Возвращает до limit + 1 строк, лишняя строка означает наличие следующей страницы.
+    """
+    normalized = query.strip().upper().replace('-', '').replace(' ', '')
+    conditions, params = ['r.trash_status IS NULL'], []
+    if user_id is not None:
+        conditions.append('r.user_id = %s')
+        params.append(user_id)
+    if status is not None:
+        conditions.append('r.status = %s')
+        params.append(status)
+    
+    # Запрос сравнивается только с тем кодом, на который он похож: цифры ISRC сами по себе могут совпасть с чужим UPC
+    if SEARCH_UPC_RE.match(normalized):
+        rank_sql = '1.0::real'
+        from_sql, from_params = 't_p4903350_kedoo_music_distribu.releases r', []
+        conditions.append('t_p4903350_kedoo_music_distribu.normalize_upc(r.upc) = t_p4903350_kedoo_music_distribu.normalize_upc(%s)')
+        params.append(query)
+    elif SEARCH_ISRC_RE.match(normalized):
+        rank_sql = '1.0::real'
+        from_sql, from_params = 't_p4903350_kedoo_music_distribu.releases r', []
+        conditions.append('''r.id IN (
+            SELECT release_id FROM t_p4903350_kedoo_music_distribu.tracks
+            WHERE t_p4903350_kedoo_music_distribu.normalize_isrc(isrc) = t_p4903350_kedoo_music_distribu.normalize_isrc(%s)
+        )''')
+        params.append(query)
+    else:
+        rank_sql = 'ts_rank(r.search_vector, q)'
+        from_sql = "t_p4903350_kedoo_music_distribu.releases r, websearch_to_tsquery('simple', %s) q"
+        from_params = [query]
+        conditions.append('r.search_vector @@ q')
+    
+    if after:
+        conditions.append(f'({rank_sql}, r.id) < (%s::real, %s)')
+        params.extend(after)
+    
+    cursor.execute(f'''
+        SELECT {RELEASE_COLUMNS_SQL}, ({TRACK_COUNT_SQL}) as track_count, p.rank
+        FROM (
+            SELECT r.*, {rank_sql} as rank
+            FROM {from_sql}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY rank DESC, r.id DESC
+            LIMIT %s
+        ) p
+        ORDER BY p.rank DESC, p.id DESC
+    ''', from_params + params + [limit + 1])
+    return cursor.fetchall()
+
+def parse_sync_token(token: str) -> datetime:
+    """Разбор отметки времени сервера без часового пояса, ValueError при некорректном значении"""
+    since = datetime.fromisoformat(token)
+    if since.tzinfo is not None:
+        raise ValueError('Invalid sync token')
+    return since
+
+EVENTS_CHANNEL = 'release_events'
+LONG_POLL_MAX_SECONDS = int(os.environ.get('LONG_POLL_MAX_SECONDS', '25'))
+
+def wait_for_release_events(conn, timeout: int, is_relevant, missed_query: tuple = None) -> list:
+    """
+    Long-poll: подписка LISTEN на release_events и ожидание подходящих уведомлений до timeout секунд.
+    missed_query выполняется уже после подписки и ловит изменения, случившиеся
+    между прошлым запросом клиента и LISTEN. Соединение отписывается до возврата в пул.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f'LISTEN {EVENTS_CHANNEL}')
+    conn.commit()
+    # Уведомления, оставшиеся на соединении от прошлого вызова, к этому ожиданию не относятся
+    del conn.notifies[:]
+    try:
+        if missed_query:
+            cursor.execute(*missed_query)
+            missed = cursor.fetchone() is not None
+            # Не держим открытую транзакцию на время ожидания
+            conn.rollback()
+            if missed:
+                return [{'event': 'missed'}]
+        
+        deadline = time.monotonic() + timeout
+        events = []
+        while not events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([conn], [], [], remaining)[0]:
+                break
+            conn.poll()
+            while conn.notifies:
+                notification = json.loads(conn.notifies.pop(0).payload)
+                if is_relevant(notification):
+                    events.append(notification)
+        return events
+    finally:
+        cursor.execute('UNLISTEN *')
+        conn.commit()
+        del conn.notifies[:]
+
+PENDING_CHANGES_EXIST_SQL = '''
+    SELECT 1 FROM t_p4903350_kedoo_music_distribu.releases
+    WHERE status = 'pending' AND trash_status IS NULL AND updated_at > %s
+    LIMIT 1
+'''
+
+def compute_etag(*parts) -> str:
+    """Слабый ETag из параметров запроса и версии данных"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def etag_matches(event: dict, etag: str) -> bool:
+    """Проверка заголовка If-None-Match (слабое сравнение)"""
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+def not_modified_response(etag: str) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag'
+        },
+        'body': ''
+    }
+
+QUEUE_CACHE_SIZE = int(os.environ.get('QUEUE_CACHE_SIZE', '32'))
+QUEUE_CACHE_TTL = float(os.environ.get('QUEUE_CACHE_TTL', '30'))
+
+_queue_cache = OrderedDict()
+_queue_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+def queue_cache_get(key: tuple, etag: str):
+    """Сериализованная очередь из кеша, если запись не истекла и версия данных совпадает"""
+    entry = _queue_cache.get(key)
+    if entry is not None:
+        expires_at, cached_etag, body = entry
+        if expires_at > time.monotonic() and cached_etag == etag:
+            _queue_cache.move_to_end(key)
+            _queue_cache_stats['hits'] += 1
+            return body
+        del _queue_cache[key]
+    _queue_cache_stats['misses'] += 1
+    return None
+
+def queue_cache_put(key: tuple, etag: str, body: str):
+    _queue_cache[key] = (time.monotonic() + QUEUE_CACHE_TTL, etag, body)
+    _queue_cache.move_to_end(key)
+    while len(_queue_cache) > QUEUE_CACHE_SIZE:
+        _queue_cache.popitem(last=False)
+        _queue_cache_stats['evictions'] += 1
+
+def invalidate_queue_cache():
+    """
+    Сброс кеша после решений модератора в этом экземпляре. Правки релизов в функции releases
+    сюда не доходят: устаревшую запись отсекает сверка версии данных (ETag) в queue_cache_get.
+    """
+    _queue_cache.clear()
+    _queue_cache_stats['invalidations'] += 1
+
+def get_queue_cache_stats() -> dict:
+    """Счётчики кеша очереди для мониторинга"""
+    return dict(_queue_cache_stats, size=len(_queue_cache), max_size=QUEUE_CACHE_SIZE)
+
+def queue_cache_header(cache_status: str) -> str:
+    """Значение X-Cache: HIT/MISS и счётчики кеша этого экземпляра функции"""
+    stats = get_queue_cache_stats()
+    return (
+        f"{cache_status}; hits={stats['hits']}; misses={stats['misses']}; evictions={stats['evictions']}; "
+        f"invalidations={stats['invalidations']}; size={stats['size']}/{stats['max_size']}"
+    )
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+def accepted_encodings(event: dict) -> set:
+    """Кодировки из Accept-Encoding, кроме явно запрещённых через q=0"""
+    headers = event.get('headers') or {}
+    accept = headers.get('Accept-Encoding') or headers.get('accept-encoding') or ''
+    encodings = set()
+    for part in accept.lower().split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            encodings.add(name.strip())
+    return encodings
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Сжатие крупного JSON-тела в br или gzip по Accept-Encoding клиента"""
+    if response.get('statusCode') != 200:
+        return response
+    body = response.get('body') or ''
+    response['headers']['Vary'] = 'Accept-Encoding'
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+    encodings = accepted_encodings(event)
+    started = time.perf_counter()
+    if brotli is not None and 'br' in encodings:
+        encoding, compressed = 'br', brotli.compress(body.encode(), quality=BROTLI_QUALITY)
+    elif 'gzip' in encodings or '*' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(body.encode(), compresslevel=GZIP_LEVEL)
+    else:
+        return response
+    timing_add('compress', time.perf_counter() - started)
+    response['headers']['Content-Encoding'] = encoding
+    response['body'] = base64.b64encode(compressed).decode()
+    response['isBase64Encoded'] = True
+    return response
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', '200'))
+EXPORT_MAX_CHUNK_BYTES = int(os.environ.get('EXPORT_MAX_CHUNK_BYTES', str(3 * 1024 * 1024)))
+# Запас под данные, которые gzip и текстовый буфер ещё не сбросили в файл, и последний релиз
+EXPORT_FLUSH_MARGIN_BYTES = 128 * 1024
+# Тело ответа - base64 от gzip, поэтому на сжатые данные остаётся 3/4 лимита
+EXPORT_MAX_GZIP_BYTES = max(EXPORT_MAX_CHUNK_BYTES * 3 // 4 - EXPORT_FLUSH_MARGIN_BYTES, 1)
+EXPORT_SPOOL_BYTES = int(os.environ.get('EXPORT_SPOOL_BYTES', str(1024 * 1024)))
+EXPORT_RELEASE_FIELDS = (
+    'id', 'user_id', 'title', 'upc', 'genre', 'cover_url', 'old_release_date', 'new_release_date',
+    'status', 'rejection_reason', 'created_at', 'updated_at'
+)
+EXPORT_TRACK_FIELDS = (
+    'title', 'audio_url', 'tiktok_moment', 'music_author', 'lyrics_author', 'has_explicit',
+    'performers', 'producers', 'isrc', 'language', 'track_order', 'lyrics', 'is_instrumental'
+)
+
+def iter_catalogue(conn, user_id=None, after_id: int = 0):
+    """Релизы с треками по возрастанию id через серверный курсор: в памяти не больше EXPORT_FETCH_SIZE строк"""
+    scope_sql, params = '', [after_id]
+    if user_id is not None:
+        scope_sql = 'AND p.user_id = %s'
+        params.append(user_id)
+    with conn.cursor(name='catalogue_export', cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(f'''
+            SELECT {RELEASE_COLUMNS_SQL}, ({TRACKS_JSON_SQL}) as tracks
+            FROM t_p4903350_kedoo_music_distribu.releases p
+            WHERE p.id > %s AND p.trash_status IS NULL {scope_sql}
+            ORDER BY p.id
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+def write_catalogue_export(text, fmt: str, releases, is_full=lambda: False) -> tuple:
+    """
+    Запись релизов в текстовый поток: NDJSON по релизу на строку или CSV по строке на трек.
+    Останавливается, когда is_full() вернул True; возвращает (число релизов, id последнего, выгружено ли всё).
+    """
+    writer = csv.writer(text) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_RELEASE_FIELDS + tuple(f'track_{field}' for field in EXPORT_TRACK_FIELDS))
+    count, last_id = 0, None
+    for release in releases:
+        if is_full():
+            return count, last_id, False
+        if writer:
+            release_values = [release[field] for field in EXPORT_RELEASE_FIELDS]
+            for track in release['tracks'] or [{}]:
+                writer.writerow(release_values + [track.get(field) for field in EXPORT_TRACK_FIELDS])
+        else:
+            text.write(json.dumps(release, default=json_default, ensure_ascii=False) + '\n')
+        count += 1
+        last_id = release['id']
+    return count, last_id, True
+
+def export_response(conn, fmt: str, after_id: int, user_id=None) -> dict:
+    """
+    Часть выгрузки каталога начиная после after_id в виде gzip-файла. Сжатые данные копятся
+    во временном файле, тело ответа в base64 не превышает EXPORT_MAX_CHUNK_BYTES; если выгружено не всё,
+    X-Export-Next-Cursor содержит after для следующей части.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    releases = iter_catalogue(conn, user_id, after_id)
+    try:
+        with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=GZIP_LEVEL) as archive:
+            text = io.TextIOWrapper(archive, encoding='utf-8', newline='')
+            count, last_id, complete = write_catalogue_export(
+                text, fmt, releases, lambda: spool.tell() >= EXPORT_MAX_GZIP_BYTES
+            )
+            text.flush()
+            text.detach()
+    finally:
+        releases.close()
+    spool.seek(0)
+    
+    headers = {
+        'Content-Type': 'application/gzip',
+        'Content-Disposition': f'attachment; filename="catalogue-{after_id}.{fmt}.gz"',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'Content-Disposition, X-Export-Count, X-Export-Next-Cursor',
+        'Cache-Control': 'no-store',
+        'X-Export-Count': str(count)
+    }
+    if not complete:
+        headers['X-Export-Next-Cursor'] = str(last_id)
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': base64.b64encode(spool.read()).decode(),
+        'isBase64Encoded': True
+    }
+
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def verify_session_token(token: str):
+    """Проверка подписи и срока действия токена без обращения к базе, None если токен недействителен"""
+    payload, _, signature = token.partition('.')
+    if not SESSION_SECRET or not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+REQUIRE_SESSION_TOKEN = os.environ.get('REQUIRE_SESSION_TOKEN') == 'true'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('REVOCATION_REFRESH_SECONDS', '60'))
+
+_revoked_tokens = {'jti': frozenset(), 'loaded_at': float('-inf')}
+
+def get_bearer_token(event: dict):
+    headers = event.get('headers') or {}
+    authorization = headers.get('Authorization') or headers.get('authorization') or ''
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):].strip()
+    return None
+
+def is_token_revoked(cursor, jti: str) -> bool:
+    """Проверка по локальной копии deny-list, которая перечитывается раз в REVOCATION_REFRESH_SECONDS"""
+    if time.monotonic() - _revoked_tokens['loaded_at'] >= REVOCATION_REFRESH_SECONDS:
+        cursor.execute('''
+            SELECT jti FROM t_p4903350_kedoo_music_distribu.revoked_tokens WHERE expires_at > NOW()
+        ''')
+        _revoked_tokens['jti'] = frozenset(row['jti'] for row in cursor.fetchall())
+        _revoked_tokens['loaded_at'] = time.monotonic()
+    return jti in _revoked_tokens['jti']
+
+MODERATOR_ROLES = ('admin', 'moderator')
+
+@timed_handler
 def handler(event: dict, context) -> dict:
     """API для модераторов: просмотр всех релизов, принятие и отклонение с указанием причины"""
     
@@ -14,13 +817,36 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Moderator-Id'
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Moderator-Id, If-None-Match'
             },
             'body': ''
         }
     
+    conn = None
     try:
-        moderator_id = event.get('headers', {}).get('X-Moderator-Id') or event.get('headers', {}).get('x-moderator-id')
+        token = get_bearer_token(event)
+        claims = verify_session_token(token) if token else None
+        
+        if token and not claims:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid or expired session token'})
+            }
+        
+        if claims and claims.get('role') not in MODERATOR_ROLES:
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Moderator role required'})
+            }
+        
+        if claims:
+            moderator_id = claims['uid']
+        elif not REQUIRE_SESSION_TOKEN:
+            moderator_id = event.get('headers', {}).get('X-Moderator-Id') or event.get('headers', {}).get('x-moderator-id')
+        else:
+            moderator_id = None
         
         if not moderator_id:
             return {
@@ -29,81 +855,383 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'Moderator ID required'})
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if method not in ('GET', 'POST'):
+            return {
+                'statusCode': 405,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Method not allowed'})
+            }
         
+        # Параметры GET проверяются до подключения к базе
         if method == 'GET':
             params = event.get('queryStringParameters') or {}
+            
+            try:
+                release_ids = parse_release_ids(params['ids']) if params.get('ids') else None
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid release ids'})
+                }
+            
+            try:
+                limit = min(max(int(params.get('limit') or SEARCH_PAGE_SIZE), 1), SEARCH_MAX_PAGE_SIZE)
+                after = decode_search_cursor(params['cursor']) if params.get('search') and params.get('cursor') else None
+            except (ValueError, TypeError):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid limit or cursor'})
+                }
+            
+            try:
+                export_format = params.get('export')
+                export_after = int(params.get('after') or 0)
+                if (export_format and export_format not in EXPORT_FORMATS) or export_after < 0:
+                    raise ValueError('Invalid export format or cursor')
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid export format or cursor'})
+                }
+            
+            try:
+                wait_timeout = min(max(int(params.get('timeout') or LONG_POLL_MAX_SECONDS), 0), LONG_POLL_MAX_SECONDS)
+                events_since = parse_sync_token(params['since']) if params.get('view') == 'events' and params.get('since') else None
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid timeout or since'})
+                }
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        
+        if claims and is_token_revoked(cursor, claims['jti']):
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Session revoked'})
+            }
+        
+        if method == 'GET':
+            if release_ids:
+                cursor.execute(f'''
+                    SELECT p.id, ({TRACKS_JSON_SQL}) as tracks
+                    FROM t_p4903350_kedoo_music_distribu.releases p
+                    WHERE p.id = ANY(%s)
+                ''', (release_ids,))
+                tracks = {str(row['id']): row['tracks'] or [] for row in cursor.fetchall()}
+                
+                return compress_response(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'tracks': tracks})
+                })
+            
+            if export_format:
+                return export_response(conn, export_format, export_after)
+            
+            if params.get('view') == 'events':
+                missed_query = (PENDING_CHANGES_EXIST_SQL, (events_since,)) if events_since else None
+                events = wait_for_release_events(
+                    conn, wait_timeout,
+                    lambda notification: notification.get('status') == 'pending' and notification.get('event') in ('created', 'updated', 'restored'),
+                    missed_query
+                )
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'no-store'},
+                    'body': json.dumps({'events': events})
+                }
+            
+            if params.get('view') == 'counts':
+                # Общие счётчики платформы хранятся в строках с user_id = 0
+                cursor.execute('''
+                    SELECT status, release_count
+                    FROM t_p4903350_kedoo_music_distribu.release_status_counts
+                    WHERE user_id = 0 AND NOT in_trash AND release_count > 0
+                ''')
+                counts = {row['status']: int(row['release_count']) for row in cursor.fetchall()}
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'private, no-cache'},
+                    'body': json.dumps({'counts': counts, 'backlog': counts.get('pending', 0)})
+                }
+            
+            if params.get('search'):
+                releases = search_releases(cursor, params['search'], limit, after, status=params.get('status'))
+                next_cursor = None
+                if len(releases) > limit:
+                    releases = releases[:limit]
+                    next_cursor = encode_search_cursor(releases[-1]['rank'], releases[-1]['id'])
+                
+                return compress_response(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': serialize({'releases': releases, 'next_cursor': next_cursor})
+                })
+            
             status_filter = params.get('status', 'pending')
+            compact = params.get('view') == 'compact'
             
+            # Взятие и снятие аренды не меняют updated_at, поэтому в версию входит отпечаток всех аренд:
+            # хеш не зависит от порядка строк и меняется при любом claim/unclaim/продлении
             cursor.execute('''
-                SELECT r.*, 
-                       json_agg(
-                           json_build_object(
-                               'id', t.id,
-                               'title', t.title,
-                               'audio_url', t.audio_url,
-                               'tiktok_moment', t.tiktok_moment,
-                               'music_author', t.music_author,
-                               'lyrics_author', t.lyrics_author,
-                               'has_explicit', t.has_explicit,
-                               'performers', t.performers,
-                               'producers', t.producers,
-                               'isrc', t.isrc,
-                               'language', t.language,
-                               'track_order', t.track_order,
-                               'lyrics', t.lyrics,
-                               'is_instrumental', t.is_instrumental
-                           ) ORDER BY t.track_order
-                       ) FILTER (WHERE t.id IS NOT NULL) as tracks
-                FROM t_p4903350_kedoo_music_distribu.releases r
-                LEFT JOIN t_p4903350_kedoo_music_distribu.tracks t ON r.id = t.release_id
-                WHERE r.status = %s AND r.trash_status IS NULL
-                GROUP BY r.id
-                ORDER BY r.created_at DESC
+                SELECT count(*) as total, max(updated_at) as last_updated, max(id) as last_id,
+                       count(claimed_by) as claimed,
+                       sum(hashtext(concat_ws(':', id, claimed_by, claim_expires_at))) FILTER (WHERE claimed_by IS NOT NULL) as claims_hash
+                FROM t_p4903350_kedoo_music_distribu.releases
+                WHERE status = %s AND trash_status IS NULL
             ''', (status_filter,))
+            version = cursor.fetchone()
+            etag = compute_etag(
+                'moderation', status_filter, compact,
+                version['total'], version['last_updated'], version['last_id'], version['claimed'], version['claims_hash']
+            )
+            if etag_matches(event, etag):
+                return not_modified_response(etag)
             
-            releases = cursor.fetchall()
-            conn.close()
-            
-            releases_list = []
-            for release in releases:
-                release_dict = dict(release)
-                if release_dict['created_at']:
-                    release_dict['created_at'] = release_dict['created_at'].isoformat()
-                if release_dict['updated_at']:
-                    release_dict['updated_at'] = release_dict['updated_at'].isoformat()
-                if release_dict.get('old_release_date'):
-                    release_dict['old_release_date'] = release_dict['old_release_date'].isoformat()
-                if release_dict.get('new_release_date'):
-                    release_dict['new_release_date'] = release_dict['new_release_date'].isoformat()
-                releases_list.append(release_dict)
+            cache_key = (status_filter, compact)
+            response_body = queue_cache_get(cache_key, etag)
+            cache_status = 'HIT'
+            if response_body is None:
+                cache_status = 'MISS'
+                if compact:
+                    tracks_column, tracks_alias = TRACK_COUNT_SQL, 'track_count'
+                else:
+                    tracks_column, tracks_alias = TRACKS_JSON_SQL, 'tracks'
             
-            return {
+                cursor.execute(f'''
+                    SELECT row_to_json(queue)::text as release_json
+                    FROM (
+                        SELECT {RELEASE_COLUMNS_SQL}, ({tracks_column}) as {tracks_alias}
+                        FROM t_p4903350_kedoo_music_distribu.releases p
+                        WHERE p.status = %s AND p.trash_status IS NULL
+                    ) queue
+                    ORDER BY queue.created_at DESC
+                ''', (status_filter,))
+            
+                response_body = serialize_rows('releases', [row['release_json'] for row in cursor.fetchall()])
+                queue_cache_put(cache_key, etag, response_body)
+            
+            return compress_response(event, {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'releases': releases_list})
-            }
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'ETag, X-Cache',
+                    'ETag': etag,
+                    'Cache-Control': 'private, no-cache',
+                    'X-Cache': queue_cache_header(cache_status)
+                },
+                'body': response_body
+            })
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
             action = body.get('action')
             release_id = body.get('release_id')
             
-            if action == 'approve':
+            if action == 'claim':
+                try:
+                    limit = min(max(int(body.get('limit') or CLAIM_BATCH_SIZE), 1), CLAIM_MAX_BATCH_SIZE)
+                except (ValueError, TypeError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid limit'})
+                    }
+                
+                # Продление аренды уже взятых модератором релизов, самых срочных и не больше limit
+                cursor.execute('''
+                    UPDATE t_p4903350_kedoo_music_distribu.releases r
+                    SET claim_expires_at = NOW() + %s * INTERVAL '1 second'
+                    FROM (
+                        SELECT id FROM t_p4903350_kedoo_music_distribu.releases
+                        WHERE claimed_by = %s AND claim_expires_at > NOW()
+                          AND status = 'pending' AND trash_status IS NULL
+                        ORDER BY new_release_date NULLS LAST, created_at, id
+                        LIMIT %s
+                        FOR UPDATE
+                    ) held_releases
+                    WHERE r.id = held_releases.id
+                    RETURNING r.id
+                ''', (CLAIM_LEASE_SECONDS, int(moderator_id), limit))
+                claimed_ids = [row['id'] for row in cursor.fetchall()]
+                
+                # Свободные релизы в порядке срочности, занятые другими транзакциями пропускаются
+                if len(claimed_ids) < limit:
+                    cursor.execute('''
+                        UPDATE t_p4903350_kedoo_music_distribu.releases r
+                        SET claimed_by = %s, claim_expires_at = NOW() + %s * INTERVAL '1 second'
+                        FROM (
+                            SELECT id FROM t_p4903350_kedoo_music_distribu.releases
+                            WHERE status = 'pending' AND trash_status IS NULL
+                              AND (claimed_by IS NULL OR claim_expires_at < NOW())
+                            ORDER BY new_release_date NULLS LAST, created_at, id
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        ) next_releases
+                        WHERE r.id = next_releases.id
+                        RETURNING r.id
+                    ''', (int(moderator_id), CLAIM_LEASE_SECONDS, limit - len(claimed_ids)))
+                    claimed_ids.extend(row['id'] for row in cursor.fetchall())
+                
+                cursor.execute(f'''
+                    SELECT {RELEASE_COLUMNS_SQL}, ({TRACKS_JSON_SQL}) as tracks
+                    FROM t_p4903350_kedoo_music_distribu.releases p
+                    WHERE p.id = ANY(%s)
+                    ORDER BY p.new_release_date NULLS LAST, p.created_at, p.id
+                ''', (claimed_ids,))
+                releases = cursor.fetchall()
+                conn.commit()
+                
+                return compress_response(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': serialize({'releases': releases, 'lease_seconds': CLAIM_LEASE_SECONDS})
+                })
+            
+            elif action == 'unclaim':
+                release_ids = body.get('release_ids') or ([release_id] if release_id else [])
+                try:
+                    if not isinstance(release_ids, list):
+                        raise TypeError
+                    release_ids = [int(rid) for rid in release_ids]
+                except (ValueError, TypeError):
+                    release_ids = []
+                if not release_ids or len(release_ids) > BULK_MAX_RELEASES:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Between 1 and {BULK_MAX_RELEASES} valid release ids are required'})
+                    }
+                
+                cursor.execute('''
+                    UPDATE t_p4903350_kedoo_music_distribu.releases
+                    SET claimed_by = NULL, claim_expires_at = NULL
+                    WHERE id = ANY(%s) AND claimed_by = %s
+                ''', (release_ids, int(moderator_id)))
+                released = cursor.rowcount
+                conn.commit()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, 'released': released})
+                }
+            
+            elif action == 'check_duplicates':
+                upcs, isrcs = body.get('upcs') or [], body.get('isrcs') or []
+                if (not isinstance(upcs, list) or not isinstance(isrcs, list)
+                        or not all(isinstance(code, str) for code in upcs + isrcs)
+                        or len(upcs) + len(isrcs) > DUPLICATE_CHECK_MAX_CODES
+                        or not isinstance(body.get('exclude_release_id'), (int, type(None)))):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Up to {DUPLICATE_CHECK_MAX_CODES} UPC/ISRC strings are allowed'})
+                    }
+                
+                duplicates = find_duplicate_codes(cursor, upcs, isrcs, exclude_release_id=body.get('exclude_release_id'))
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'duplicates': duplicates})
+                }
+            
+            elif action in ('bulk_approve', 'bulk_reject'):
+                if action == 'bulk_approve':
+                    items = [{'release_id': rid} for rid in body.get('release_ids') or []]
+                else:
+                    items = body.get('items') or []
+                
+                decisions = {}
+                try:
+                    for item in items:
+                        reason = item.get('rejection_reason') or body.get('rejection_reason') or None
+                        if action == 'bulk_reject' and not reason:
+                            raise ValueError('Rejection reason is required')
+                        decisions[int(item['release_id'])] = reason if action == 'bulk_reject' else None
+                    if not decisions or len(decisions) > BULK_MAX_RELEASES:
+                        raise ValueError(f'Between 1 and {BULK_MAX_RELEASES} releases are required')
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e) if isinstance(e, ValueError) else 'Invalid items'})
+                    }
+                
+                status = 'approved' if action == 'bulk_approve' else 'rejected'
+                results = bulk_moderate(cursor, int(moderator_id), status, list(decisions), list(decisions.values()))
+                
+                # Как и при одиночном одобрении, дубликаты кодов возвращаются по каждому одобренному релизу
+                approved_ids = [result['release_id'] for result in results if result['outcome'] == 'approved']
+                if approved_ids:
+                    cursor.execute('''
+                        SELECT p.id, p.upc, (
+                            SELECT json_agg(json_build_object('isrc', t.isrc))
+                            FROM t_p4903350_kedoo_music_distribu.tracks t
+                            WHERE t.release_id = p.id AND t.isrc IS NOT NULL
+                        ) as tracks
+                        FROM t_p4903350_kedoo_music_distribu.releases p
+                        WHERE p.id = ANY(%s)
+                    ''', (approved_ids,))
+                    duplicates = find_batch_duplicates(cursor, {row['id']: release_codes(row) for row in cursor.fetchall()})
+                    for result in results:
+                        if result['release_id'] in duplicates:
+                            result['duplicates'] = duplicates[result['release_id']]
+                
+                conn.commit()
+                invalidate_queue_cache()
+                
+                summary = {}
+                for result in results:
+                    summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, 'results': results, 'summary': summary})
+                }
+            
+            elif action == 'approve':
                 cursor.execute('''
                     UPDATE t_p4903350_kedoo_music_distribu.releases 
-                    SET status = 'approved', rejection_reason = NULL, updated_at = NOW()
-                    WHERE id = %s
+                    SET status = 'approved', rejection_reason = NULL, updated_at = NOW(),
+                        claimed_by = NULL, claim_expires_at = NULL
+                    WHERE id = %s AND (claimed_by IS NULL OR claimed_by = %s OR claim_expires_at < NOW())
+                ''', (release_id, int(moderator_id)))
+                
+                if cursor.rowcount == 0:
+                    return claim_conflict_response(cursor, release_id)
+                
+                # Дубликаты кодов не блокируют одобрение, а возвращаются модератору
+                cursor.execute('''
+                    SELECT p.upc, (
+                        SELECT json_agg(json_build_object('isrc', t.isrc))
+                        FROM t_p4903350_kedoo_music_distribu.tracks t
+                        WHERE t.release_id = p.id AND t.isrc IS NOT NULL
+                    ) as tracks
+                    FROM t_p4903350_kedoo_music_distribu.releases p
+                    WHERE p.id = %s
                 ''', (release_id,))
+                duplicates = find_duplicate_codes(cursor, *release_codes(cursor.fetchone()), exclude_release_id=release_id)
                 
                 conn.commit()
-                conn.close()
+                invalidate_queue_cache()
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'message': 'Release approved'})
+                    'body': json.dumps({'success': True, 'message': 'Release approved', 'duplicates': duplicates})
                 }
             
             elif action == 'reject':
@@ -118,12 +1246,16 @@ def handler(event: dict, context) -> dict:
                 
                 cursor.execute('''
                     UPDATE t_p4903350_kedoo_music_distribu.releases 
-                    SET status = 'rejected', rejection_reason = %s, updated_at = NOW()
-                    WHERE id = %s
-                ''', (rejection_reason, release_id))
+                    SET status = 'rejected', rejection_reason = %s, updated_at = NOW(),
+                        claimed_by = NULL, claim_expires_at = NULL
+                    WHERE id = %s AND (claimed_by IS NULL OR claimed_by = %s OR claim_expires_at < NOW())
+                ''', (rejection_reason, release_id, int(moderator_id)))
+                
+                if cursor.rowcount == 0:
+                    return claim_conflict_response(cursor, release_id)
                 
                 conn.commit()
-                conn.close()
+                invalidate_queue_cache()
                 
                 return {
                     'statusCode': 200,
@@ -131,7 +1263,6 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'success': True, 'message': 'Release rejected'})
                 }
         
-        conn.close()
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -144,3 +1275,6 @@ def handler(event: dict, context) -> dict:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        if conn is not None:
+            release_db_connection(conn)
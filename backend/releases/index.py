@@ -1,9 +1,1126 @@
+import csv
+import io
+import functools
 import json
+import re
+import select
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+import time
+import hmac
+import hashlib
+import gzip
+import base64
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+psycopg2 = None
+
+def load_db_driver():
+    """Ленивый импорт psycopg2: preflight и ранние 4xx-ответы обходятся без драйвера"""
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2.extras
+        import psycopg2.pool
+
+DB_POOL_MAXCONN = int(os.environ.get('DB_POOL_MAXCONN', '4'))
+DB_POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+_pool = None
+_last_used = {}
+_pool_stats = {
+    'checkouts': 0, 'opened': 0, 'reused': 0, 'reconnects': 0, 'discarded': 0, 'exhausted': 0,
+    'in_use': 0, 'peak_in_use': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0
+}
+
+def _get_pool():
+    """Пул соединений уровня модуля, переживающий тёплые вызовы функции"""
+    global _pool
+    load_db_driver()
+    if _pool is None or _pool.closed:
+        options = {'connection_factory': _timed_connection_class()} if REQUEST_TIMING else {}
+        _pool = psycopg2.pool.ThreadedConnectionPool(1, DB_POOL_MAXCONN, os.environ['DATABASE_URL'], **options)
+        _last_used.clear()
+    return _pool
+
+def _is_connection_alive(conn) -> bool:
+    """Проверка соединения: дешёвая по статусу, SELECT 1 только после долгого простоя"""
+    if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_PING_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as ping:
+            ping.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _discard_connection(pool, conn):
+    _last_used.pop(id(conn), None)
+    _pool_stats['discarded'] += 1
+    pool.putconn(conn, close=True)
+
+def get_db_connection():
+    """Получение живого подключения из пула с переподключением при обрыве"""
+    if _request_timing is None:
+        return _checkout_connection()
+    started = time.perf_counter()
+    _request_timing['connecting'] = True
+    try:
+        return _checkout_connection()
+    finally:
+        _request_timing['connecting'] = False
+        timing_add('connect', time.perf_counter() - started)
+
+def _checkout_connection():
+    pool = _get_pool()
+    _pool_stats['checkouts'] += 1
+    started = time.perf_counter()
+    try:
+        conn = _take_live_connection(pool)
+    except psycopg2.pool.PoolError:
+        _pool_stats['exhausted'] += 1
+        print(json.dumps({'event': 'pool_exhausted', 'function': 'releases', 'pool': get_pool_stats()}))
+        raise
+    waited_ms = (time.perf_counter() - started) * 1000
+    _pool_stats['wait_ms_total'] += waited_ms
+    _pool_stats['wait_ms_max'] = max(_pool_stats['wait_ms_max'], waited_ms)
+    _pool_stats['in_use'] += 1
+    _pool_stats['peak_in_use'] = max(_pool_stats['peak_in_use'], _pool_stats['in_use'])
+    return conn
+
+def _take_live_connection(pool):
+    while True:
+        conn = pool.getconn()
+        if id(conn) not in _last_used:
+            _pool_stats['opened'] += 1
+            return conn
+        if _is_connection_alive(conn):
+            _pool_stats['reused'] += 1
+            return conn
+        _discard_connection(pool, conn)
+        _pool_stats['reconnects'] += 1
+
+def release_db_connection(conn):
+    """Откат незавершённой транзакции и возврат подключения в пул"""
+    pool = _get_pool()
+    _pool_stats['in_use'] = max(_pool_stats['in_use'] - 1, 0)
+    try:
+        if not conn.closed:
+            conn.rollback()
+    except psycopg2.Error:
+        pass
+    if conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        _discard_connection(pool, conn)
+        return
+    _last_used[id(conn)] = time.monotonic()
+    pool.putconn(conn)
+    if conn.closed:
+        _last_used.pop(id(conn), None)
+
+def get_pool_stats() -> dict:
+    """
+    Статистика пула по счётчикам get_db_connection/release_db_connection с момента холодного старта.
+    Попадает в строку лога запроса (REQUEST_TIMING) и в лог pool_exhausted.
+    """
+    stats = dict(_pool_stats)
+    stats['wait_ms_total'] = round(stats['wait_ms_total'], 1)
+    stats['wait_ms_max'] = round(stats['wait_ms_max'], 1)
+    stats['max'] = DB_POOL_MAXCONN
+    return stats
+
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+
+_request_timing = None
+_timed_connection = None
+
+def timing_add(phase: str, seconds: float):
+    """Добавляет время к фазе текущего запроса; без REQUEST_TIMING ничего не делает"""
+    if _request_timing is not None:
+        phases = _request_timing['phases']
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+def redact_sql(query) -> str:
+    """Текст запроса в одну строку без строковых литералов (execute_values подставляет значения в текст)"""
+    text = query.decode(errors='replace') if isinstance(query, bytes) else str(query)
+    return SQL_LITERAL_RE.sub("'?'", ' '.join(text.split()))[:2000]
+
+def redact_params(params):
+    """Вместо значений параметров - только их типы и размеры"""
+    if params is None:
+        return None
+    values = params.values() if isinstance(params, dict) else params
+    return [
+        f'{type(value).__name__}[{len(value)}]' if isinstance(value, (list, tuple)) else type(value).__name__
+        for value in values
+    ]
+
+def record_query(query, params, seconds: float, rowcount: int):
+    """Учёт запроса в статистике текущего запроса и лог медленного SQL"""
+    if _request_timing is None:
+        return
+    if not _request_timing['connecting']:
+        timing_add('db', seconds)
+    _request_timing['queries'] += 1
+    _request_timing['rows'] += max(rowcount, 0)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        print(json.dumps({
+            'event': 'slow_query',
+            'function': 'releases',
+            'ms': round(seconds * 1000, 1),
+            'sql': redact_sql(query),
+            'params': redact_params(params)
+        }))
+
+def _timed_connection_class():
+    """Класс соединения, курсоры которого замеряют каждый execute; создаётся только при включённом REQUEST_TIMING"""
+    global _timed_connection
+    if _timed_connection is None:
+        cursor_classes = {}
+        
+        class TimedConnection(psycopg2.extensions.connection):
+            def cursor(self, *args, **kwargs):
+                factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+                if factory not in cursor_classes:
+                    def execute(cursor, query, params=None, _execute=factory.execute):
+                        started = time.perf_counter()
+                        try:
+                            return _execute(cursor, query, params)
+                        finally:
+                            record_query(query, params, time.perf_counter() - started, cursor.rowcount)
+                    cursor_classes[factory] = type(f'Timed{factory.__name__}', (factory,), {'execute': execute})
+                kwargs['cursor_factory'] = cursor_classes[factory]
+                return super().cursor(*args, **kwargs)
+        
+        _timed_connection = TimedConnection
+    return _timed_connection
+
+def timed_handler(handle):
+    """
+    Замер фаз запроса (connect, db, serialize, compress, остальное - app): заголовок Server-Timing
+    и одна JSON-строка лога на запрос. Без REQUEST_TIMING вызывает handler напрямую.
+    """
+    @functools.wraps(handle)
+    def wrapper(event: dict, context) -> dict:
+        global _request_timing
+        if not REQUEST_TIMING:
+            return handle(event, context)
+        
+        _request_timing = {'phases': {}, 'queries': 0, 'rows': 0, 'connecting': False}
+        started = time.perf_counter()
+        try:
+            response = handle(event, context)
+        finally:
+            timing, _request_timing = _request_timing, None
+        total = time.perf_counter() - started
+        
+        phases = {name: round(seconds * 1000, 1) for name, seconds in timing['phases'].items()}
+        phases['app'] = round(max(total - sum(timing['phases'].values()), 0) * 1000, 1)
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={ms}' for name, ms in phases.items()] + [f'total;dur={total * 1000:.1f}']
+        )
+        headers['Timing-Allow-Origin'] = '*'
+        print(json.dumps({
+            'event': 'request',
+            'function': 'releases',
+            'method': event.get('httpMethod'),
+            'status': response.get('statusCode'),
+            'ms': round(total * 1000, 1),
+            'phases': phases,
+            'queries': timing['queries'],
+            'rows': timing['rows'],
+            'bytes': len(response.get('body') or ''),
+            'pool': get_pool_stats()
+        }))
+        return response
+    return wrapper
+
+def json_default(value):
+    """Хук json.dumps: даты и время в ISO 8601, Decimal в число"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def serialize(payload) -> str:
+    """json.dumps тела ответа через json_default; время попадает в фазу serialize"""
+    if _request_timing is None:
+        return json.dumps(payload, default=json_default)
+    started = time.perf_counter()
+    body = json.dumps(payload, default=json_default)
+    timing_add('serialize', time.perf_counter() - started)
+    return body
+
+def serialize_rows(key: str, row_texts: list, **fields) -> str:
+    """
+    Тело ответа со списком строк, которые PostgreSQL уже собрал в JSON через row_to_json:
+    Python не разбирает и не кодирует их заново, а только склеивает текст; остальные поля через json_default.
+    """
+    started = time.perf_counter()
+    body = '{' + json.dumps(key) + ': [' + ','.join(row_texts) + ']'
+    if fields:
+        body += ', ' + json.dumps(fields, default=json_default)[1:-1]
+    body += '}'
+    timing_add('serialize', time.perf_counter() - started)
+    return body
+
+TRACKS_JSON_SQL = '''
+    SELECT json_agg(
+        json_build_object(
+            'id', t.id,
+            'title', t.title,
+            'audio_url', t.audio_url,
+            'tiktok_moment', t.tiktok_moment,
+            'music_author', t.music_author,
+            'lyrics_author', t.lyrics_author,
+            'has_explicit', t.has_explicit,
+            'performers', t.performers,
+            'producers', t.producers,
+            'isrc', t.isrc,
+            'language', t.language,
+            'track_order', t.track_order,
+            'lyrics', t.lyrics,
+            'is_instrumental', t.is_instrumental
+        ) ORDER BY t.track_order
+    )
+    FROM t_p4903350_kedoo_music_distribu.tracks t
+    WHERE t.release_id = p.id
+'''
+
+RELEASE_COLUMNS_SQL = '''
+    p.id, p.user_id, p.title, p.upc, p.genre, p.cover_url, p.old_release_date, p.new_release_date,
+    p.status, COALESCE(p.rejection_reason, '') as rejection_reason, p.created_at, p.updated_at, p.trash_status
+'''
+
+TRACK_COUNT_SQL = '''
+    SELECT count(*) FROM t_p4903350_kedoo_music_distribu.tracks t WHERE t.release_id = p.id
+'''
+
+DETAIL_MAX_IDS = int(os.environ.get('DETAIL_MAX_IDS', '100'))
+
+def parse_release_ids(raw: str) -> list:
+    """Разбор списка id релизов вида '1,2,3', ValueError при некорректном значении"""
+    ids = list(dict.fromkeys(int(part) for part in raw.split(',') if part.strip()))
+    if not ids or len(ids) > DETAIL_MAX_IDS:
+        raise ValueError('Invalid release ids')
+    return ids
+
+TRACK_INSERT_SQL = '''
+    INSERT INTO t_p4903350_kedoo_music_distribu.tracks 
+    (release_id, title, audio_url, tiktok_moment, music_author, lyrics_author, 
+     has_explicit, performers, producers, isrc, language, track_order, lyrics, is_instrumental, created_at)
+    VALUES %s
+'''
+TRACK_INSERT_TEMPLATE = '(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())'
+
+def track_row(release_id: int, track: dict, track_order: int) -> tuple:
+    """Значения трека в порядке колонок TRACK_INSERT_SQL"""
+    return (
+        release_id,
+        track.get('title'),
+        track.get('audio_url'),
+        track.get('tiktok_moment'),
+        track.get('music_author'),
+        track.get('lyrics_author'),
+        track.get('has_explicit', False),
+        track.get('performers'),
+        track.get('producers'),
+        track.get('isrc'),
+        track.get('language'),
+        track_order,
+        track.get('lyrics'),
+        track.get('is_instrumental', False)
+    )
+
+def insert_track_rows(cursor, rows: list) -> list:
+    """Вставка подготовленных строк треков одним многострочным INSERT, возвращает их id"""
+    if not rows:
+        return []
+    result = psycopg2.extras.execute_values(cursor, TRACK_INSERT_SQL + ' RETURNING id', rows,
+                            template=TRACK_INSERT_TEMPLATE, page_size=len(rows), fetch=True)
+    return [row['id'] for row in result]
+
+def insert_tracks(cursor, release_id: int, tracks: list) -> list:
+    """Вставка всех треков релиза одним многострочным INSERT"""
+    return insert_track_rows(cursor, [track_row(release_id, track, idx + 1) for idx, track in enumerate(tracks)])
+
+IMPORT_MAX_RELEASES = int(os.environ.get('IMPORT_MAX_RELEASES', '1000'))
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '100'))
+IMPORT_MAX_CHUNK_SIZE = int(os.environ.get('IMPORT_MAX_CHUNK_SIZE', '500'))
+IMPORT_TRACK_PAGE_SIZE = int(os.environ.get('IMPORT_TRACK_PAGE_SIZE', '1000'))
+IMPORT_STATUSES = ('draft', 'pending')
+IMPORT_RELEASE_LIMITS = {'title': 255, 'upc': 50, 'genre': 100}
+IMPORT_TRACK_LIMITS = {
+    'title': 255, 'tiktok_moment': 50, 'music_author': 255, 'lyrics_author': 255, 'isrc': 50, 'language': 50
+}
+IMPORT_RELEASE_INSERT_SQL = '''
+    INSERT INTO t_p4903350_kedoo_music_distribu.releases 
+    (id, user_id, title, upc, genre, cover_url, old_release_date, new_release_date, status, created_at, updated_at)
+    VALUES %s
+'''
+IMPORT_RELEASE_TEMPLATE = '(%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())'
+
+def parse_ndjson(raw: str) -> list:
+    """Разбор NDJSON по релизу на строку; некорректная строка становится None и отклоняется валидацией"""
+    items = []
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(None)
+    return items
+
+def validate_import_release(item) -> list:
+    """Проверка релиза из пакета импорта до обращения к базе, возвращает список ошибок"""
+    if not isinstance(item, dict):
+        return ['Release must be a JSON object']
+    errors = []
+    if not item.get('title'):
+        errors.append('title is required')
+    for field, max_length in IMPORT_RELEASE_LIMITS.items():
+        if item.get(field) is not None and (not isinstance(item[field], str) or len(item[field]) > max_length):
+            errors.append(f'{field} must be a string of at most {max_length} characters')
+    for field in ('old_release_date', 'new_release_date'):
+        if item.get(field):
+            try:
+                date.fromisoformat(item[field])
+            except (TypeError, ValueError):
+                errors.append(f'{field} must be a YYYY-MM-DD date')
+    if item.get('status', 'pending') not in IMPORT_STATUSES:
+        errors.append(f'status must be one of: {", ".join(IMPORT_STATUSES)}')
+    
+    tracks = item.get('tracks') or []
+    if not isinstance(tracks, list):
+        return errors + ['tracks must be a list']
+    for number, track in enumerate(tracks, start=1):
+        if not isinstance(track, dict) or not track.get('title'):
+            errors.append(f'track {number}: title is required')
+            continue
+        for field, max_length in IMPORT_TRACK_LIMITS.items():
+            if track.get(field) is not None and (not isinstance(track[field], str) or len(track[field]) > max_length):
+                errors.append(f'track {number}: {field} must be a string of at most {max_length} characters')
+        for field in ('has_explicit', 'is_instrumental'):
+            if not isinstance(track.get(field, False), bool):
+                errors.append(f'track {number}: {field} must be a boolean')
+    return errors
+
+def insert_import_chunk(cursor, user_id: int, chunk: list) -> list:
+    """
+    Вставка пачки релизов и всех их треков многострочными INSERT.
+    id релизов берутся из последовательности заранее, чтобы сопоставить треки без RETURNING.
+    """
+    cursor.execute('''
+        SELECT nextval(pg_get_serial_sequence('t_p4903350_kedoo_music_distribu.releases', 'id')) as id
+        FROM generate_series(1, %s)
+    ''', (len(chunk),))
+    release_ids = [row['id'] for row in cursor.fetchall()]
+    
+    psycopg2.extras.execute_values(cursor, IMPORT_RELEASE_INSERT_SQL, [
+        (
+            release_id,
+            user_id,
+            item.get('title'),
+            item.get('upc'),
+            item.get('genre'),
+            item.get('cover_url'),
+            item.get('old_release_date') or None,
+            item.get('new_release_date') or None,
+            item.get('status', 'pending')
+        )
+        for release_id, (_, item) in zip(release_ids, chunk)
+    ], template=IMPORT_RELEASE_TEMPLATE, page_size=len(chunk))
+    
+    track_rows = [
+        track_row(release_id, track, number)
+        for release_id, (_, item) in zip(release_ids, chunk)
+        for number, track in enumerate(item.get('tracks') or [], start=1)
+    ]
+    if track_rows:
+        psycopg2.extras.execute_values(cursor, TRACK_INSERT_SQL, track_rows,
+                                       template=TRACK_INSERT_TEMPLATE, page_size=IMPORT_TRACK_PAGE_SIZE)
+    return release_ids
+
+def import_releases(conn, user_id: int, items: list, chunk_size: int) -> list:
+    """
+    Импорт пакета релизов: весь пакет проверяется заранее, корректные релизы загружаются
+    пачками по chunk_size, каждая пачка - отдельная транзакция. Если база отклонила пачку,
+    она повторяется по одному релизу, чтобы ошибка досталась только виновному элементу.
+    """
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    results = [None] * len(items)
+    valid = []
+    seen_upcs = {}
+    for index, item in enumerate(items):
+        errors = validate_import_release(item)
+        if not errors and item.get('upc'):
+            if item['upc'] in seen_upcs:
+                errors = [f'upc duplicates item {seen_upcs[item["upc"]]}']
+            seen_upcs.setdefault(item['upc'], index)
+        if errors:
+            results[index] = {'index': index, 'errors': errors}
+        else:
+            valid.append((index, item))
+    
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            release_ids = insert_import_chunk(cursor, user_id, chunk)
+            conn.commit()
+        except psycopg2.Error:
+            conn.rollback()
+            release_ids = []
+            for index, item in chunk:
+                try:
+                    release_ids.extend(insert_import_chunk(cursor, user_id, [(index, item)]))
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    release_ids.append(None)
+                    results[index] = {'index': index, 'errors': [e.diag.message_primary or str(e)]}
+        
+        for (index, _), release_id in zip(chunk, release_ids):
+            if release_id is not None:
+                results[index] = {'index': index, 'release_id': release_id}
+    
+    return results
+
+TRACK_COLUMNS = (
+    'release_id', 'title', 'audio_url', 'tiktok_moment', 'music_author', 'lyrics_author',
+    'has_explicit', 'performers', 'producers', 'isrc', 'language', 'track_order', 'lyrics', 'is_instrumental'
+)
+TRACK_UPDATE_SQL = '''
+    UPDATE t_p4903350_kedoo_music_distribu.tracks t
+    SET title = v.title, audio_url = v.audio_url, tiktok_moment = v.tiktok_moment,
+        music_author = v.music_author, lyrics_author = v.lyrics_author, has_explicit = v.has_explicit,
+        performers = v.performers, producers = v.producers, isrc = v.isrc, language = v.language,
+        track_order = v.track_order, lyrics = v.lyrics, is_instrumental = v.is_instrumental
+    FROM (VALUES %s) AS v(id, release_id, title, audio_url, tiktok_moment, music_author, lyrics_author,
+                          has_explicit, performers, producers, isrc, language, track_order, lyrics, is_instrumental)
+    WHERE t.id = v.id AND t.release_id = v.release_id
+'''
+TRACK_UPDATE_TEMPLATE = (
+    '(%s::integer, %s::integer, %s::text, %s::text, %s::text, %s::text, %s::text, '
+    '%s::boolean, %s::text, %s::text, %s::text, %s::text, %s::integer, %s::text, %s::boolean)'
+)
+
+def stored_track_id(value):
+    """id сохранённого трека или None: временные id нового трека из формы (temp-...) не числа"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+def sync_tracks(cursor, release_id: int, tracks: list) -> dict:
+    """
+    Приводит треки релиза к переданному списку, сравнивая по id трека:
+    изменённые обновляются, новые вставляются, отсутствующие удаляются, остальные не трогаются.
+    """
+    release_id = int(release_id)
+    cursor.execute(f'''
+        SELECT id, {', '.join(TRACK_COLUMNS)}
+        FROM t_p4903350_kedoo_music_distribu.tracks
+        WHERE release_id = %s
+    ''', (release_id,))
+    stored = {row['id']: tuple(row[column] for column in TRACK_COLUMNS) for row in cursor.fetchall()}
+    
+    to_insert, to_update, kept_ids, positions = [], [], set(), []
+    for idx, track in enumerate(tracks):
+        row = track_row(release_id, track, idx + 1)
+        track_id = stored_track_id(track.get('id'))
+        if track_id in stored and track_id not in kept_ids:
+            kept_ids.add(track_id)
+            positions.append(track_id)
+            if stored[track_id] != row:
+                to_update.append((track_id,) + row)
+        else:
+            positions.append(None)
+            to_insert.append(row)
+    
+    to_delete = [track_id for track_id in stored if track_id not in kept_ids]
+    if to_delete:
+        cursor.execute('''
+            DELETE FROM t_p4903350_kedoo_music_distribu.tracks WHERE id = ANY(%s) AND release_id = %s
+        ''', (to_delete, release_id))
+    if to_update:
+        psycopg2.extras.execute_values(cursor, TRACK_UPDATE_SQL, to_update, template=TRACK_UPDATE_TEMPLATE, page_size=len(to_update))
+    new_ids = iter(insert_track_rows(cursor, to_insert))
+    
+    return {
+        'track_ids': [track_id if track_id is not None else next(new_ids) for track_id in positions],
+        'inserted': len(to_insert),
+        'updated': len(to_update),
+        'deleted': len(to_delete),
+        'unchanged': len(kept_ids) - len(to_update)
+    }
+
+RELEASES_PAGE_SIZE = int(os.environ.get('RELEASES_PAGE_SIZE', '50'))
+RELEASES_MAX_PAGE_SIZE = int(os.environ.get('RELEASES_MAX_PAGE_SIZE', '200'))
+
+def encode_cursor(sort_value: datetime, release_id: int) -> str:
+    """Непрозрачный курсор страницы: ключ сортировки и id последнего релиза"""
+    raw = json.dumps([sort_value.isoformat(), release_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Разбор курсора, ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, release_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value).isoformat(), int(release_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+SYNC_OVERLAP_SECONDS = float(os.environ.get('SYNC_OVERLAP_SECONDS', '30'))
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', '500'))
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', '30'))
+
+def parse_sync_token(token: str) -> datetime:
+    """Разбор токена синхронизации (время сервера без часового пояса), ValueError при некорректном значении"""
+    since = datetime.fromisoformat(token)
+    if since.tzinfo is not None:
+        raise ValueError('Invalid sync token')
+    return since
+
+def fetch_release_changes(cursor, user_id: int, since: datetime, compact: bool):
+    """
+    Изменения каталога артиста после since: изменённые релизы целиком и надгробия
+    для удалённых и перенесённых в корзину. Новый токен отстаёт от часов сервера на
+    SYNC_OVERLAP_SECONDS, чтобы не пропустить транзакции, закоммиченные позже своего NOW().
+    None, если токен старше срока хранения надгробий или изменений слишком много.
+    """
+    cursor.execute('''
+        SELECT LOCALTIMESTAMP - make_interval(secs => %s) as sync_time,
+               LOCALTIMESTAMP - make_interval(days => %s) as oldest_since
+    ''', (SYNC_OVERLAP_SECONDS, TOMBSTONE_RETENTION_DAYS))
+    clock = cursor.fetchone()
+    if since < clock['oldest_since']:
+        return None
+    
+    if compact:
+        tracks_column, tracks_alias = TRACK_COUNT_SQL, 'track_count'
+    else:
+        tracks_column, tracks_alias = TRACKS_JSON_SQL, 'tracks'
+    
+    cursor.execute(f'''
+        SELECT {RELEASE_COLUMNS_SQL}, ({tracks_column}) as {tracks_alias}
+        FROM t_p4903350_kedoo_music_distribu.releases p
+        WHERE p.user_id = %s AND p.updated_at > %s AND p.trash_status IS NULL
+        ORDER BY p.updated_at, p.id
+        LIMIT %s
+    ''', (user_id, since, SYNC_MAX_CHANGES + 1))
+    releases = cursor.fetchall()
+    if len(releases) > SYNC_MAX_CHANGES:
+        return None
+    
+    cursor.execute('''
+        SELECT id as release_id, 'trashed' as reason
+        FROM t_p4903350_kedoo_music_distribu.releases
+        WHERE user_id = %s AND trash_status > %s
+        UNION ALL
+        SELECT release_id, 'deleted' as reason
+        FROM t_p4903350_kedoo_music_distribu.release_tombstones
+        WHERE user_id = %s AND deleted_at > %s
+    ''', (user_id, since, user_id, since))
+    
+    return {
+        'releases': releases,
+        'tombstones': cursor.fetchall(),
+        'sync_token': clock['sync_time'].isoformat()
+    }
+
+EVENTS_CHANNEL = 'release_events'
+LONG_POLL_MAX_SECONDS = int(os.environ.get('LONG_POLL_MAX_SECONDS', '25'))
+
+def wait_for_release_events(conn, timeout: int, is_relevant, missed_query: tuple = None) -> list:
+    """
+    Long-poll: подписка LISTEN на release_events и ожидание подходящих уведомлений до timeout секунд.
+    missed_query выполняется уже после подписки и ловит изменения, случившиеся
+    между прошлым запросом клиента и LISTEN. Соединение отписывается до возврата в пул.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f'LISTEN {EVENTS_CHANNEL}')
+    conn.commit()
+    # Уведомления, оставшиеся на соединении от прошлого вызова, к этому ожиданию не относятся
+    del conn.notifies[:]
+    try:
+        if missed_query:
+            cursor.execute(*missed_query)
+            missed = cursor.fetchone() is not None
+            # Не держим открытую транзакцию на время ожидания
+            conn.rollback()
+            if missed:
+                return [{'event': 'missed'}]
+        
+        deadline = time.monotonic() + timeout
+        events = []
+        while not events:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([conn], [], [], remaining)[0]:
+                break
+            conn.poll()
+            while conn.notifies:
+                notification = json.loads(conn.notifies.pop(0).payload)
+                if is_relevant(notification):
+                    events.append(notification)
+        return events
+    finally:
+        cursor.execute('UNLISTEN *')
+        conn.commit()
+        del conn.notifies[:]
+
+RELEASE_CHANGES_EXIST_SQL = '''
+    SELECT 1 FROM t_p4903350_kedoo_music_distribu.releases
+    WHERE user_id = %s AND updated_at > %s AND trash_status IS NULL
+    UNION ALL
+    SELECT 1 FROM t_p4903350_kedoo_music_distribu.releases
+    WHERE user_id = %s AND trash_status > %s
+    UNION ALL
+    SELECT 1 FROM t_p4903350_kedoo_music_distribu.release_tombstones
+    WHERE user_id = %s AND deleted_at > %s
+    LIMIT 1
+'''
+
+DUPLICATE_CHECK_MAX_CODES = int(os.environ.get('DUPLICATE_CHECK_MAX_CODES', '1000'))
+
+def find_duplicate_codes(cursor, upcs: list, isrcs: list, exclude_release_id=None) -> list:
+    """
+    Одним запросом ищет активные релизы с такими же UPC или треки с такими же ISRC.
+    Коды сравниваются в нормализованном виде по индексам normalize_upc/normalize_isrc.
+    """
+    if not upcs and not isrcs:
+        return []
+    cursor.execute('''
+        WITH upcs AS (
+            SELECT DISTINCT code, t_p4903350_kedoo_music_distribu.normalize_upc(code) as normalized
+            FROM unnest(%s::text[]) AS code
+        ), isrcs AS (
+            SELECT DISTINCT code, t_p4903350_kedoo_music_distribu.normalize_isrc(code) as normalized
+            FROM unnest(%s::text[]) AS code
+        )
+        SELECT 'upc' as kind, u.code, r.id as release_id, r.user_id, r.title, r.status, NULL::integer as track_id
+        FROM upcs u
+        JOIN t_p4903350_kedoo_music_distribu.releases r
+          ON t_p4903350_kedoo_music_distribu.normalize_upc(r.upc) = u.normalized AND r.trash_status IS NULL
+        WHERE r.id IS DISTINCT FROM %s
+        UNION ALL
+        SELECT 'isrc' as kind, i.code, r.id as release_id, r.user_id, r.title, r.status, t.id as track_id
+        FROM isrcs i
+        JOIN t_p4903350_kedoo_music_distribu.tracks t
+          ON t_p4903350_kedoo_music_distribu.normalize_isrc(t.isrc) = i.normalized
+        JOIN t_p4903350_kedoo_music_distribu.releases r ON r.id = t.release_id AND r.trash_status IS NULL
+        WHERE r.id IS DISTINCT FROM %s
+    ''', (upcs, isrcs, exclude_release_id, exclude_release_id))
+    return cursor.fetchall()
+
+def release_codes(release: dict) -> tuple:
+    """UPC релиза и ISRC его треков для проверки на дубликаты"""
+    upcs = [release['upc']] if release.get('upc') else []
+    isrcs = [track['isrc'] for track in release.get('tracks') or [] if isinstance(track, dict) and track.get('isrc')]
+    return upcs, isrcs
+
+def find_batch_duplicates(cursor, codes_by_release: dict) -> dict:
+    """
+    Проверка пачки релизов одним запросом: коды всех релизов ищутся вместе,
+    затем совпадения раскладываются по релизам, которым принадлежит код.
+    """
+    upcs = sorted({code for release_upcs, _ in codes_by_release.values() for code in release_upcs})
+    isrcs = sorted({code for _, release_isrcs in codes_by_release.values() for code in release_isrcs})
+    rows_by_code = {}
+    for row in find_duplicate_codes(cursor, upcs, isrcs):
+        rows_by_code.setdefault((row['kind'], row['code']), []).append(row)
+    
+    duplicates = {}
+    for release_id, (release_upcs, release_isrcs) in codes_by_release.items():
+        codes = [('upc', code) for code in release_upcs] + [('isrc', code) for code in dict.fromkeys(release_isrcs)]
+        duplicates[release_id] = [
+            row for code in codes for row in rows_by_code.get(code, ()) if row['release_id'] != release_id
+        ]
+    return duplicates
+
+def describe_duplicates(rows: list, user_id: int) -> list:
+    """Дубликаты для артиста: свои релизы с подробностями, чужие - только факт совпадения кода"""
+    duplicates = []
+    for row in rows:
+        if row['user_id'] == user_id:
+            duplicates.append({
+                'kind': row['kind'], 'code': row['code'], 'owned': True,
+                'release_id': row['release_id'], 'title': row['title'], 'status': row['status'], 'track_id': row['track_id']
+            })
+        else:
+            duplicates.append({'kind': row['kind'], 'code': row['code'], 'owned': False})
+    return duplicates
+
+SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', '20'))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', '100'))
+SEARCH_UPC_RE = re.compile(r'^\d{8,14}$')
+SEARCH_ISRC_RE = re.compile(r'^[A-Z]{2}[A-Z0-9]{3}\d{7}$')
+
+def encode_search_cursor(rank: float, release_id: int) -> str:
+    """Курсор страницы поиска: ранг и id последнего релиза"""
+    raw = json.dumps([rank, release_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_search_cursor(cursor: str) -> tuple:
+    """Разбор курсора поиска, ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        rank, release_id = json.loads(raw)
+        return float(rank), int(release_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+def search_releases(cursor, query: str, limit: int, after=None, user_id=None, status=None) -> list:
+    """
+    Поиск по каталогу: UPC и ISRC ищутся точным совпадением по индексам,
+    остальное - полнотекстово по search_vector с ранжированием ts_rank.
+    Возвращает до limit + 1 строк, лишняя строка означает наличие следующей страницы.
+    """
+    normalized = query.strip().upper().replace('-', '').replace(' ', '')
+    conditions, params = ['r.trash_status IS NULL'], []
+    if user_id is not None:
+        conditions.append('r.user_id = %s')
+        params.append(user_id)
+    if status is not None:
+        conditions.append('r.status = %s')
+        params.append(status)
+    
+    # Запрос сравнивается только с тем кодом, на который он похож: цифры ISRC сами по себе могут совпасть с чужим UPC
+    if SEARCH_UPC_RE.match(normalized):
+        rank_sql = '1.0::real'
+        from_sql, from_params = 't_p4903350_kedoo_music_distribu.releases r', []
+        conditions.append('t_p4903350_kedoo_music_distribu.normalize_upc(r.upc) = t_p4903350_kedoo_music_distribu.normalize_upc(%s)')
+        params.append(query)
+    elif SEARCH_ISRC_RE.match(normalized):
+        rank_sql = '1.0::real'
+        from_sql, from_params = 't_p4903350_kedoo_music_distribu.releases r', []
+        conditions.append('''r.id IN (
+            SELECT release_id FROM t_p4903350_kedoo_music_distribu.tracks
+            WHERE t_p4903350_kedoo_music_distribu.normalize_isrc(isrc) = t_p4903350_kedoo_music_distribu.normalize_isrc(%s)
+        )''')
+        params.append(query)
+    else:
+        rank_sql = 'ts_rank(r.search_vector, q)'
+        from_sql = "t_p4903350_kedoo_music_distribu.releases r, websearch_to_tsquery('simple', %s) q"
+        from_params = [query]
+        conditions.append('r.search_vector @@ q')
+    
+    if after:
+        conditions.append(f'({rank_sql}, r.id) < (%s::real, %s)')
+        params.extend(after)
+    
+    cursor.execute(f'''
+        SELECT {RELEASE_COLUMNS_SQL}, ({TRACK_COUNT_SQL}) as track_count, p.rank
+        FROM (
+            SELECT r.*, {rank_sql} as rank
+            FROM {from_sql}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY rank DESC, r.id DESC
+            LIMIT %s
+        ) p
+        ORDER BY p.rank DESC, p.id DESC
+    ''', from_params + params + [limit + 1])
+    return cursor.fetchall()
+
+def compute_etag(*parts) -> str:
+    """Слабый ETag из параметров запроса и версии данных"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def etag_matches(event: dict, etag: str) -> bool:
+    """Проверка заголовка If-None-Match (слабое сравнение)"""
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+def not_modified_response(etag: str) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag'
+        },
+        'body': ''
+    }
+
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+
+def accepted_encodings(event: dict) -> set:
+    """Кодировки из Accept-Encoding, кроме явно запрещённых через q=0"""
+    headers = event.get('headers') or {}
+    accept = headers.get('Accept-Encoding') or headers.get('accept-encoding') or ''
+    encodings = set()
+    for part in accept.lower().split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            encodings.add(name.strip())
+    return encodings
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Сжатие крупного JSON-тела в br или gzip по Accept-Encoding клиента"""
+    if response.get('statusCode') != 200:
+        return response
+    body = response.get('body') or ''
+    response['headers']['Vary'] = 'Accept-Encoding'
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+    encodings = accepted_encodings(event)
+    started = time.perf_counter()
+    if brotli is not None and 'br' in encodings:
+        encoding, compressed = 'br', brotli.compress(body.encode(), quality=BROTLI_QUALITY)
+    elif 'gzip' in encodings or '*' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(body.encode(), compresslevel=GZIP_LEVEL)
+    else:
+        return response
+    timing_add('compress', time.perf_counter() - started)
+    response['headers']['Content-Encoding'] = encoding
+    response['body'] = base64.b64encode(compressed).decode()
+    response['isBase64Encoded'] = True
+    return response
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', '200'))
+EXPORT_MAX_CHUNK_BYTES = int(os.environ.get('EXPORT_MAX_CHUNK_BYTES', str(3 * 1024 * 1024)))
+# Запас под данные, которые gzip и текстовый буфер ещё не сбросили в файл, и последний релиз
+EXPORT_FLUSH_MARGIN_BYTES = 128 * 1024
+# Тело ответа - base64 от gzip, поэтому на сжатые данные остаётся 3/4 лимита
+EXPORT_MAX_GZIP_BYTES = max(EXPORT_MAX_CHUNK_BYTES * 3 // 4 - EXPORT_FLUSH_MARGIN_BYTES, 1)
+EXPORT_SPOOL_BYTES = int(os.environ.get('EXPORT_SPOOL_BYTES', str(1024 * 1024)))
+EXPORT_RELEASE_FIELDS = (
+    'id', 'user_id', 'title', 'upc', 'genre', 'cover_url', 'old_release_date', 'new_release_date',
+    'status', 'rejection_reason', 'created_at', 'updated_at'
+)
+EXPORT_TRACK_FIELDS = (
+    'title', 'audio_url', 'tiktok_moment', 'music_author', 'lyrics_author', 'has_explicit',
+    'performers', 'producers', 'isrc', 'language', 'track_order', 'lyrics', 'is_instrumental'
+)
+
+def iter_catalogue(conn, user_id=None, after_id: int = 0):
+    """Релизы с треками по возрастанию id через серверный курсор: в памяти не больше EXPORT_FETCH_SIZE строк"""
+    scope_sql, params = '', [after_id]
+    if user_id is not None:
+        scope_sql = 'AND p.user_id = %s'
+        params.append(user_id)
+    with conn.cursor(name='catalogue_export', cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(f'''
+            SELECT {RELEASE_COLUMNS_SQL}, ({TRACKS_JSON_SQL}) as tracks
+            FROM t_p4903350_kedoo_music_distribu.releases p
+            WHERE p.id > %s AND p.trash_status IS NULL {scope_sql}
+            ORDER BY p.id
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+def write_catalogue_export(text, fmt: str, releases, is_full=lambda: False) -> tuple:
+    """
+    Запись релизов в текстовый поток: NDJSON по релизу на строку или CSV по строке на трек.
+    Останавливается, когда is_full() вернул True; возвращает (число релизов, id последнего, выгружено ли всё).
+    """
+    writer = csv.writer(text) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_RELEASE_FIELDS + tuple(f'track_{field}' for field in EXPORT_TRACK_FIELDS))
+    count, last_id = 0, None
+    for release in releases:
+        if is_full():
+            return count, last_id, False
+        if writer:
+            release_values = [release[field] for field in EXPORT_RELEASE_FIELDS]
+            for track in release['tracks'] or [{}]:
+                writer.writerow(release_values + [track.get(field) for field in EXPORT_TRACK_FIELDS])
+        else:
+            text.write(json.dumps(release, default=json_default, ensure_ascii=False) + '\n')
+        count += 1
+        last_id = release['id']
+    return count, last_id, True
+
+def export_response(conn, fmt: str, after_id: int, user_id=None) -> dict:
+    """
+    Часть выгрузки каталога начиная после after_id в виде gzip-файла. Сжатые данные копятся
+    во временном файле, тело ответа в base64 не превышает EXPORT_MAX_CHUNK_BYTES; если выгружено не всё,
+    X-Export-Next-Cursor содержит after для следующей части.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    releases = iter_catalogue(conn, user_id, after_id)
+    try:
+        with gzip.GzipFile(fileobj=spool, mode='wb', compresslevel=GZIP_LEVEL) as archive:
+            text = io.TextIOWrapper(archive, encoding='utf-8', newline='')
+            count, last_id, complete = write_catalogue_export(
+                text, fmt, releases, lambda: spool.tell() >= EXPORT_MAX_GZIP_BYTES
+            )
+            text.flush()
+            text.detach()
+    finally:
+        releases.close()
+    spool.seek(0)
+    
+    headers = {
+        'Content-Type': 'application/gzip',
+        'Content-Disposition': f'attachment; filename="catalogue-{after_id}.{fmt}.gz"',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'Content-Disposition, X-Export-Count, X-Export-Next-Cursor',
+        'Cache-Control': 'no-store',
+        'X-Export-Count': str(count)
+    }
+    if not complete:
+        headers['X-Export-Next-Cursor'] = str(last_id)
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': base64.b64encode(spool.read()).decode(),
+        'isBase64Encoded': True
+    }
+
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def verify_session_token(token: str):
+    """Проверка подписи и срока действия токена без обращения к базе, None если токен недействителен"""
+    payload, _, signature = token.partition('.')
+    if not SESSION_SECRET or not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+REQUIRE_SESSION_TOKEN = os.environ.get('REQUIRE_SESSION_TOKEN') == 'true'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('REVOCATION_REFRESH_SECONDS', '60'))
+
+_revoked_tokens = {'jti': frozenset(), 'loaded_at': float('-inf')}
+
+def get_bearer_token(event: dict):
+    headers = event.get('headers') or {}
+    authorization = headers.get('Authorization') or headers.get('authorization') or ''
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):].strip()
+    return None
+
+def is_token_revoked(cursor, jti: str) -> bool:
+    """Проверка по локальной копии deny-list, которая перечитывается раз в REVOCATION_REFRESH_SECONDS"""
+    if time.monotonic() - _revoked_tokens['loaded_at'] >= REVOCATION_REFRESH_SECONDS:
+        cursor.execute('''
+            SELECT jti FROM t_p4903350_kedoo_music_distribu.revoked_tokens WHERE expires_at > NOW()
+        ''')
+        _revoked_tokens['jti'] = frozenset(row['jti'] for row in cursor.fetchall())
+        _revoked_tokens['loaded_at'] = time.monotonic()
+    return jti in _revoked_tokens['jti']
+
+TRASH_RETENTION_DAYS = int(os.environ.get('TRASH_RETENTION_DAYS', '30'))
+TRASH_PURGE_BATCH_SIZE = int(os.environ.get('TRASH_PURGE_BATCH_SIZE', '200'))
+TRASH_PURGE_TIME_BUDGET = float(os.environ.get('TRASH_PURGE_TIME_BUDGET', '20'))
+TRASH_PURGE_KEY = os.environ.get('TRASH_PURGE_KEY', '')
+
+def purge_expired_trash(conn, retention_days: int, batch_size: int, time_budget: float) -> dict:
+    """
+    Окончательное удаление релизов, лежащих в корзине дольше retention_days, вместе с треками.
+    Каждая пачка - отдельная короткая транзакция, поэтому прерванная очистка продолжается
+    со следующего вызова. Работа останавливается по исчерпании time_budget секунд.
+    """
+    cursor = conn.cursor()
+    started = time.monotonic()
+    batches = []
+    complete = False
+    
+    while time.monotonic() - started < time_budget:
+        batch_started = time.monotonic()
+        try:
+            cursor.execute("SET LOCAL lock_timeout = '2s'")
+            cursor.execute("SET LOCAL statement_timeout = '10s'")
+            cursor.execute('''
+                SELECT id FROM t_p4903350_kedoo_music_distribu.releases
+                WHERE trash_status < NOW() - make_interval(days => %s)
+                ORDER BY trash_status
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ''', (retention_days, batch_size))
+            release_ids = [row[0] for row in cursor.fetchall()]
+            if not release_ids:
+                conn.rollback()
+                complete = True
+                break
+            
+            # Релизы удаляются раньше треков, чтобы триггер поиска на tracks не пересчитывал их вектор
+            cursor.execute('DELETE FROM t_p4903350_kedoo_music_distribu.releases WHERE id = ANY(%s)', (release_ids,))
+            releases_deleted = cursor.rowcount
+            cursor.execute('DELETE FROM t_p4903350_kedoo_music_distribu.tracks WHERE release_id = ANY(%s)', (release_ids,))
+            tracks_deleted = cursor.rowcount
+            conn.commit()
+        except psycopg2.OperationalError:
+            # Таймаут блокировки или запроса: пачка откатывается и будет удалена при следующем запуске
+            conn.rollback()
+            break
+        
+        batches.append({
+            'releases': releases_deleted,
+            'tracks': tracks_deleted,
+            'ms': round((time.monotonic() - batch_started) * 1000, 1)
+        })
+        if len(release_ids) < batch_size:
+            complete = True
+            break
+    
+    tombstones_deleted = 0
+    if complete:
+        # Надгробия старше срока хранения не нужны: такие токены синхронизации уже не принимаются
+        cursor.execute('''
+            DELETE FROM t_p4903350_kedoo_music_distribu.release_tombstones
+            WHERE release_id IN (
+                SELECT release_id FROM t_p4903350_kedoo_music_distribu.release_tombstones
+                WHERE deleted_at < NOW() - make_interval(days => %s)
+                LIMIT %s
+            )
+        ''', (TOMBSTONE_RETENTION_DAYS, batch_size * 10))
+        tombstones_deleted = cursor.rowcount
+        conn.commit()
+    
+    return {
+        'purged_releases': sum(batch['releases'] for batch in batches),
+        'purged_tracks': sum(batch['tracks'] for batch in batches),
+        'purged_tombstones': tombstones_deleted,
+        'batches': batches,
+        'complete': complete
+    }
+
+@timed_handler
 def handler(event: dict, context) -> dict:
     """API для управления релизами пользователя: создание, получение, обновление, удаление и восстановление"""
     
@@ -15,13 +1132,48 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id'
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-User-Id, If-None-Match'
             },
             'body': ''
         }
     
+    conn = None
     try:
-        user_id = event.get('headers', {}).get('X-User-Id') or event.get('headers', {}).get('x-user-id')
+        headers = event.get('headers') or {}
+        purge_key = headers.get('X-Purge-Key') or headers.get('x-purge-key')
+        if purge_key:
+            if method != 'POST' or not TRASH_PURGE_KEY or not hmac.compare_digest(purge_key.encode(), TRASH_PURGE_KEY.encode()):
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid purge key'})
+                }
+            
+            conn = get_db_connection()
+            result = purge_expired_trash(conn, TRASH_RETENTION_DAYS, TRASH_PURGE_BATCH_SIZE, TRASH_PURGE_TIME_BUDGET)
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(result)
+            }
+        
+        token = get_bearer_token(event)
+        claims = verify_session_token(token) if token else None
+        
+        if token and not claims:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid or expired session token'})
+            }
+        
+        if claims:
+            user_id = claims['uid']
+        elif not REQUIRE_SESSION_TOKEN:
+            user_id = event.get('headers', {}).get('X-User-Id') or event.get('headers', {}).get('x-user-id')
+        else:
+            user_id = None
         
         if not user_id:
             return {
@@ -30,98 +1182,300 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'User ID required'})
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if method not in ('GET', 'POST', 'PUT', 'DELETE'):
+            return {
+                'statusCode': 405,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Method not allowed'})
+            }
         
+        # Параметры GET проверяются до подключения к базе
         if method == 'GET':
             params = event.get('queryStringParameters') or {}
-            show_trash = params.get('trash') == 'true'
             
-            if show_trash:
+            try:
+                release_ids = parse_release_ids(params['ids']) if params.get('ids') else None
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid release ids'})
+                }
+            
+            try:
+                export_format = params.get('export')
+                export_after = int(params.get('after') or 0)
+                if (export_format and export_format not in EXPORT_FORMATS) or export_after < 0:
+                    raise ValueError('Invalid export format or cursor')
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid export format or cursor'})
+                }
+            
+            try:
+                wait_timeout = min(max(int(params.get('timeout') or LONG_POLL_MAX_SECONDS), 0), LONG_POLL_MAX_SECONDS)
+                events_since = parse_sync_token(params['since']) if params.get('view') == 'events' and params.get('since') else None
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid timeout or since'})
+                }
+            
+            try:
+                updated_since = parse_sync_token(params['updated_since']) if params.get('updated_since') else None
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid sync token'})
+                }
+            
+            try:
+                if params.get('search'):
+                    limit = min(max(int(params.get('limit') or SEARCH_PAGE_SIZE), 1), SEARCH_MAX_PAGE_SIZE)
+                    after = decode_search_cursor(params['cursor']) if params.get('cursor') else None
+                else:
+                    limit = min(max(int(params.get('limit') or RELEASES_PAGE_SIZE), 1), RELEASES_MAX_PAGE_SIZE)
+                    after = decode_cursor(params['cursor']) if params.get('cursor') else None
+            except (ValueError, TypeError):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid limit or cursor'})
+                }
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        
+        if claims and is_token_revoked(cursor, claims['jti']):
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Session revoked'})
+            }
+        
+        if method == 'GET':
+            if release_ids:
+                cursor.execute(f'''
+                    SELECT p.id, ({TRACKS_JSON_SQL}) as tracks
+                    FROM t_p4903350_kedoo_music_distribu.releases p
+                    WHERE p.id = ANY(%s) AND p.user_id = %s
+                ''', (release_ids, int(user_id)))
+                tracks = {str(row['id']): row['tracks'] or [] for row in cursor.fetchall()}
+                
+                return compress_response(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'tracks': tracks})
+                })
+            
+            if export_format:
+                return export_response(conn, export_format, export_after, user_id=int(user_id))
+            
+            if params.get('view') == 'events':
+                missed_query = (RELEASE_CHANGES_EXIST_SQL, (int(user_id), events_since) * 3) if events_since else None
+                events = wait_for_release_events(
+                    conn, wait_timeout,
+                    lambda notification: notification.get('user_id') == int(user_id),
+                    missed_query
+                )
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'no-store'},
+                    'body': json.dumps({'events': events})
+                }
+            
+            if params.get('view') == 'counts':
                 cursor.execute('''
-                    SELECT r.*, 
-                           json_agg(
-                               json_build_object(
-                                   'id', t.id,
-                                   'title', t.title,
-                                   'audio_url', t.audio_url,
-                                   'tiktok_moment', t.tiktok_moment,
-                                   'music_author', t.music_author,
-                                   'lyrics_author', t.lyrics_author,
-                                   'has_explicit', t.has_explicit,
-                                   'performers', t.performers,
-                                   'producers', t.producers,
-                                   'isrc', t.isrc,
-                                   'language', t.language,
-                                   'track_order', t.track_order,
-                                   'lyrics', t.lyrics,
-                                   'is_instrumental', t.is_instrumental
-                               ) ORDER BY t.track_order
-                           ) FILTER (WHERE t.id IS NOT NULL) as tracks
-                    FROM t_p4903350_kedoo_music_distribu.releases r
-                    LEFT JOIN t_p4903350_kedoo_music_distribu.tracks t ON r.id = t.release_id
-                    WHERE r.user_id = %s AND r.trash_status IS NOT NULL
-                    GROUP BY r.id
-                    ORDER BY r.trash_status DESC
+                    SELECT status, in_trash, release_count
+                    FROM t_p4903350_kedoo_music_distribu.release_status_counts
+                    WHERE user_id = %s AND release_count > 0
                 ''', (int(user_id),))
+                counts, trash = {}, 0
+                for row in cursor.fetchall():
+                    if row['in_trash']:
+                        trash += row['release_count']
+                    else:
+                        counts[row['status']] = row['release_count']
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'private, no-cache'},
+                    'body': json.dumps({'counts': counts, 'total': sum(counts.values()), 'trash': trash})
+                }
+            
+            if updated_since:
+                changes = fetch_release_changes(cursor, int(user_id), updated_since, params.get('view') == 'compact')
+                if changes is None:
+                    return {
+                        'statusCode': 410,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Sync token expired, reload the catalogue'})
+                    }
+                
+                return compress_response(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'private, no-cache'},
+                    'body': serialize(changes)
+                })
+            
+            if params.get('search'):
+                releases = search_releases(cursor, params['search'], limit, after, user_id=int(user_id))
+                next_cursor = None
+                if len(releases) > limit:
+                    releases = releases[:limit]
+                    next_cursor = encode_search_cursor(releases[-1]['rank'], releases[-1]['id'])
+                
+                return compress_response(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': serialize({'releases': releases, 'next_cursor': next_cursor})
+                })
+            
+            show_trash = params.get('trash') == 'true'
+            compact = params.get('view') == 'compact'
+            sort_column = 'trash_status' if show_trash else 'created_at'
+            trash_condition = 'IS NOT NULL' if show_trash else 'IS NULL'
+            
+            # Версия выборки считается по индексу без построения ответа
+            cursor.execute(f'''
+                SELECT count(*) as total, max(updated_at) as last_updated, max(id) as last_id,
+                       LOCALTIMESTAMP - make_interval(secs => %s) as sync_time
+                FROM t_p4903350_kedoo_music_distribu.releases
+                WHERE user_id = %s AND trash_status {trash_condition}
+            ''', (SYNC_OVERLAP_SECONDS, int(user_id)))
+            version = cursor.fetchone()
+            etag = compute_etag(
+                'releases', user_id, show_trash, compact, limit, params.get('cursor'),
+                version['total'], version['last_updated'], version['last_id']
+            )
+            if etag_matches(event, etag):
+                return not_modified_response(etag)
+            
+            keyset_condition = ''
+            query_params = [int(user_id)]
+            if after:
+                keyset_condition = f'AND (r.{sort_column}, r.id) < (%s::timestamp, %s)'
+                query_params.extend(after)
+            query_params.append(limit + 1)
+            
+            if compact:
+                tracks_column, tracks_alias = TRACK_COUNT_SQL, 'track_count'
             else:
-                cursor.execute('''
-                    SELECT r.*, 
-                           json_agg(
-                               json_build_object(
-                                   'id', t.id,
-                                   'title', t.title,
-                                   'audio_url', t.audio_url,
-                                   'tiktok_moment', t.tiktok_moment,
-                                   'music_author', t.music_author,
-                                   'lyrics_author', t.lyrics_author,
-                                   'has_explicit', t.has_explicit,
-                                   'performers', t.performers,
-                                   'producers', t.producers,
-                                   'isrc', t.isrc,
-                                   'language', t.language,
-                                   'track_order', t.track_order,
-                                   'lyrics', t.lyrics,
-                                   'is_instrumental', t.is_instrumental
-                               ) ORDER BY t.track_order
-                           ) FILTER (WHERE t.id IS NOT NULL) as tracks
-                    FROM t_p4903350_kedoo_music_distribu.releases r
-                    LEFT JOIN t_p4903350_kedoo_music_distribu.tracks t ON r.id = t.release_id
-                    WHERE r.user_id = %s AND r.trash_status IS NULL
-                    GROUP BY r.id
-                    ORDER BY r.created_at DESC
-                ''', (int(user_id),))
+                tracks_column, tracks_alias = TRACKS_JSON_SQL, 'tracks'
+            
+            # Сначала выбирается страница релизов по индексу, треки агрегируются только для неё;
+            # каждая строка приходит готовым JSON-текстом, отдельно - ключ сортировки для курсора
+            cursor.execute(f'''
+                SELECT row_to_json(page)::text as release_json, page.{sort_column} as sort_value, page.id
+                FROM (
+                    SELECT {RELEASE_COLUMNS_SQL}, ({tracks_column}) as {tracks_alias}
+                    FROM (
+                        SELECT r.*
+                        FROM t_p4903350_kedoo_music_distribu.releases r
+                        WHERE r.user_id = %s AND r.trash_status {trash_condition} {keyset_condition}
+                        ORDER BY r.{sort_column} DESC, r.id DESC
+                        LIMIT %s
+                    ) p
+                ) page
+                ORDER BY page.{sort_column} DESC, page.id DESC
+            ''', query_params)
             
             releases = cursor.fetchall()
-            conn.close()
-            
-            releases_list = []
-            for release in releases:
-                release_dict = dict(release)
-                if release_dict['created_at']:
-                    release_dict['created_at'] = release_dict['created_at'].isoformat()
-                if release_dict['updated_at']:
-                    release_dict['updated_at'] = release_dict['updated_at'].isoformat()
-                if release_dict.get('trash_status'):
-                    release_dict['trash_status'] = release_dict['trash_status'].isoformat()
-                if release_dict.get('old_release_date'):
-                    release_dict['old_release_date'] = release_dict['old_release_date'].isoformat()
-                if release_dict.get('new_release_date'):
-                    release_dict['new_release_date'] = release_dict['new_release_date'].isoformat()
-                if release_dict.get('rejection_reason') is None:
-                    release_dict['rejection_reason'] = ''
-                releases_list.append(release_dict)
+            next_cursor = None
+            if len(releases) > limit:
+                releases = releases[:limit]
+                next_cursor = encode_cursor(releases[-1]['sort_value'], releases[-1]['id'])
             
-            return {
+            return compress_response(event, {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'releases': releases_list})
-            }
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'ETag',
+                    'ETag': etag,
+                    'Cache-Control': 'private, no-cache'
+                },
+                'body': serialize_rows(
+                    'releases', [row['release_json'] for row in releases],
+                    next_cursor=next_cursor,
+                    sync_token=version['sync_time'].isoformat()
+                )
+            })
         
         elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
+            content_type = headers.get('Content-Type') or headers.get('content-type') or ''
+            if content_type.startswith('application/x-ndjson'):
+                params = event.get('queryStringParameters') or {}
+                body = {'action': 'import', 'releases': parse_ndjson(event.get('body') or ''), 'chunk_size': params.get('chunk_size')}
+            else:
+                body = json.loads(event.get('body', '{}'))
             action = body.get('action')
             
+            if action == 'import':
+                items = body.get('releases')
+                try:
+                    chunk_size = min(max(int(body.get('chunk_size') or IMPORT_CHUNK_SIZE), 1), IMPORT_MAX_CHUNK_SIZE)
+                    if not isinstance(items, list) or not items or len(items) > IMPORT_MAX_RELEASES:
+                        raise ValueError(f'Between 1 and {IMPORT_MAX_RELEASES} releases are required')
+                except (ValueError, TypeError) as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)})
+                    }
+                
+                started = time.perf_counter()
+                results = import_releases(conn, int(user_id), items, chunk_size)
+                elapsed = time.perf_counter() - started
+                imported = sum(1 for result in results if 'release_id' in result)
+                
+                # Дубликаты кодов не отменяют импорт: одна проверка на весь пакет, итог у каждого релиза
+                duplicates = find_batch_duplicates(cursor, {
+                    result['release_id']: release_codes(items[result['index']])
+                    for result in results if 'release_id' in result
+                })
+                for result in results:
+                    if 'release_id' in result:
+                        result['duplicates'] = describe_duplicates(duplicates[result['release_id']], int(user_id))
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({
+                        'success': True,
+                        'imported': imported,
+                        'failed': len(results) - imported,
+                        'results': results,
+                        'elapsed_ms': round(elapsed * 1000, 1),
+                        'releases_per_second': round(imported / elapsed, 1) if elapsed > 0 else None
+                    })
+                }
+            
+            if action == 'check_duplicates':
+                upcs, isrcs = body.get('upcs') or [], body.get('isrcs') or []
+                if (not isinstance(upcs, list) or not isinstance(isrcs, list)
+                        or not all(isinstance(code, str) for code in upcs + isrcs)
+                        or len(upcs) + len(isrcs) > DUPLICATE_CHECK_MAX_CODES
+                        or not isinstance(body.get('exclude_release_id'), (int, type(None)))):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Up to {DUPLICATE_CHECK_MAX_CODES} UPC/ISRC strings are allowed'})
+                    }
+                
+                duplicates = find_duplicate_codes(cursor, upcs, isrcs, exclude_release_id=body.get('exclude_release_id'))
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'duplicates': describe_duplicates(duplicates, int(user_id))})
+                }
+            
             if action == 'restore':
                 release_id = body.get('release_id')
                 cursor.execute('''
@@ -130,7 +1484,6 @@ def handler(event: dict, context) -> dict:
                     WHERE id = %s AND user_id = %s
                 ''', (release_id, int(user_id)))
                 conn.commit()
-                conn.close()
                 
                 return {
                     'statusCode': 200,
@@ -156,37 +1509,19 @@ def handler(event: dict, context) -> dict:
             
             release_id = cursor.fetchone()['id']
             
-            if body.get('tracks'):
-                for idx, track in enumerate(body['tracks']):
-                    cursor.execute('''
-                        INSERT INTO t_p4903350_kedoo_music_distribu.tracks 
-                        (release_id, title, audio_url, tiktok_moment, music_author, lyrics_author, 
-                         has_explicit, performers, producers, isrc, language, track_order, lyrics, is_instrumental, created_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-                    ''', (
-                        release_id,
-                        track.get('title'),
-                        track.get('audio_url'),
-                        track.get('tiktok_moment'),
-                        track.get('music_author'),
-                        track.get('lyrics_author'),
-                        track.get('has_explicit', False),
-                        track.get('performers'),
-                        track.get('producers'),
-                        track.get('isrc'),
-                        track.get('language'),
-                        idx + 1,
-                        track.get('lyrics'),
-                        track.get('is_instrumental', False)
-                    ))
+            insert_tracks(cursor, release_id, body.get('tracks') or [])
+            duplicates = find_duplicate_codes(cursor, *release_codes(body), exclude_release_id=release_id)
             
             conn.commit()
-            conn.close()
             
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'release_id': release_id})
+                'body': json.dumps({
+                    'success': True,
+                    'release_id': release_id,
+                    'duplicates': describe_duplicates(duplicates, int(user_id))
+                })
             }
         
         elif method == 'PUT':
@@ -210,39 +1545,26 @@ def handler(event: dict, context) -> dict:
                 int(user_id)
             ))
             
-            cursor.execute('DELETE FROM t_p4903350_kedoo_music_distribu.tracks WHERE release_id = %s', (release_id,))
-            
-            if body.get('tracks'):
-                for idx, track in enumerate(body['tracks']):
-                    cursor.execute('''
-                        INSERT INTO t_p4903350_kedoo_music_distribu.tracks 
-                        (release_id, title, audio_url, tiktok_moment, music_author, lyrics_author, 
-                         has_explicit, performers, producers, isrc, language, track_order, lyrics, is_instrumental, created_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-                    ''', (
-                        release_id,
-                        track.get('title'),
-                        track.get('audio_url'),
-                        track.get('tiktok_moment'),
-                        track.get('music_author'),
-                        track.get('lyrics_author'),
-                        track.get('has_explicit', False),
-                        track.get('performers'),
-                        track.get('producers'),
-                        track.get('isrc'),
-                        track.get('language'),
-                        idx + 1,
-                        track.get('lyrics'),
-                        track.get('is_instrumental', False)
-                    ))
+            if cursor.rowcount == 0:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Release not found'})
+                }
+            
+            tracks_result = sync_tracks(cursor, release_id, body.get('tracks') or [])
+            duplicates = find_duplicate_codes(cursor, *release_codes(body), exclude_release_id=release_id)
             
             conn.commit()
-            conn.close()
             
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True})
+                'body': json.dumps({
+                    'success': True,
+                    'tracks': tracks_result,
+                    'duplicates': describe_duplicates(duplicates, int(user_id))
+                })
             }
         
         elif method == 'DELETE':
@@ -261,7 +1583,6 @@ def handler(event: dict, context) -> dict:
                 ''', (release_id, int(user_id)))
             
             conn.commit()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -269,7 +1590,6 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'success': True})
             }
         
-        conn.close()
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -281,4 +1601,7 @@ def handler(event: dict, context) -> dict:
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+    finally:
+        if conn is not None:
+            release_db_connection(conn)
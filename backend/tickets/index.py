@@ -1,8 +1,370 @@
+import functools
 import json
+import re
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+import hmac
+import base64
+import hashlib
+from datetime import date, datetime
+from decimal import Decimal
 
+psycopg2 = None
+
+def load_db_driver():
+    """Ленивый импорт psycopg2: preflight и ранние 4xx-ответы обходятся без драйвера"""
+    global psycopg2
+    if psycopg2 is None:
+        import psycopg2.extras
+        import psycopg2.pool
+
+DB_POOL_MAXCONN = int(os.environ.get('DB_POOL_MAXCONN', '4'))
+DB_POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+_pool = None
+_last_used = {}
+_pool_stats = {
+    'checkouts': 0, 'opened': 0, 'reused': 0, 'reconnects': 0, 'discarded': 0, 'exhausted': 0,
+    'in_use': 0, 'peak_in_use': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0
+}
+
+def _get_pool():
+    """Пул соединений уровня модуля, переживающий тёплые вызовы функции"""
+    global _pool
+    load_db_driver()
+    if _pool is None or _pool.closed:
+        options = {'connection_factory': _timed_connection_class()} if REQUEST_TIMING else {}
+        _pool = psycopg2.pool.ThreadedConnectionPool(1, DB_POOL_MAXCONN, os.environ['DATABASE_URL'], **options)
+        _last_used.clear()
+    return _pool
+
+def _is_connection_alive(conn) -> bool:
+    """Проверка соединения: дешёвая по статусу, SELECT 1 только после долгого простоя"""
+    if conn.closed or conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_PING_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as ping:
+            ping.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _discard_connection(pool, conn):
+    _last_used.pop(id(conn), None)
+    _pool_stats['discarded'] += 1
+    pool.putconn(conn, close=True)
+
+def get_db_connection():
+    """Получение живого подключения из пула с переподключением при обрыве"""
+    if _request_timing is None:
+        return _checkout_connection()
+    started = time.perf_counter()
+    _request_timing['connecting'] = True
+    try:
+        return _checkout_connection()
+    finally:
+        _request_timing['connecting'] = False
+        timing_add('connect', time.perf_counter() - started)
+
+def _checkout_connection():
+    pool = _get_pool()
+    _pool_stats['checkouts'] += 1
+    started = time.perf_counter()
+    try:
+        conn = _take_live_connection(pool)
+    except psycopg2.pool.PoolError:
+        _pool_stats['exhausted'] += 1
+        print(json.dumps({'event': 'pool_exhausted', 'function': 'tickets', 'pool': get_pool_stats()}))
+        raise
+    waited_ms = (time.perf_counter() - started) * 1000
+    _pool_stats['wait_ms_total'] += waited_ms
+    _pool_stats['wait_ms_max'] = max(_pool_stats['wait_ms_max'], waited_ms)
+    _pool_stats['in_use'] += 1
+    _pool_stats['peak_in_use'] = max(_pool_stats['peak_in_use'], _pool_stats['in_use'])
+    return conn
+
+def _take_live_connection(pool):
+    while True:
+        conn = pool.getconn()
+        if id(conn) not in _last_used:
+            _pool_stats['opened'] += 1
+            return conn
+        if _is_connection_alive(conn):
+            _pool_stats['reused'] += 1
+            return conn
+        _discard_connection(pool, conn)
+        _pool_stats['reconnects'] += 1
+
+def release_db_connection(conn):
+    """Откат незавершённой транзакции и возврат подключения в пул"""
+    pool = _get_pool()
+    _pool_stats['in_use'] = max(_pool_stats['in_use'] - 1, 0)
+    try:
+        if not conn.closed:
+            conn.rollback()
+    except psycopg2.Error:
+        pass
+    if conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        _discard_connection(pool, conn)
+        return
+    _last_used[id(conn)] = time.monotonic()
+    pool.putconn(conn)
+    if conn.closed:
+        _last_used.pop(id(conn), None)
+
+def get_pool_stats() -> dict:
+    """
+    Статистика пула по счётчикам get_db_connection/release_db_connection с момента холодного старта.
+    Попадает в строку лога запроса (REQUEST_TIMING) и в лог pool_exhausted.
+    """
+    stats = dict(_pool_stats)
+    stats['wait_ms_total'] = round(stats['wait_ms_total'], 1)
+    stats['wait_ms_max'] = round(stats['wait_ms_max'], 1)
+    stats['max'] = DB_POOL_MAXCONN
+    return stats
+
+REQUEST_TIMING = os.environ.get('REQUEST_TIMING') == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+
+_request_timing = None
+_timed_connection = None
+
+def timing_add(phase: str, seconds: float):
+    """Добавляет время к фазе текущего запроса; без REQUEST_TIMING ничего не делает"""
+    if _request_timing is not None:
+        phases = _request_timing['phases']
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+def redact_sql(query) -> str:
+    """Текст запроса в одну строку без строковых литералов (execute_values подставляет значения в текст)"""
+    text = query.decode(errors='replace') if isinstance(query, bytes) else str(query)
+    return SQL_LITERAL_RE.sub("'?'", ' '.join(text.split()))[:2000]
+
+def redact_params(params):
+    """Вместо значений параметров - только их типы и размеры"""
+    if params is None:
+        return None
+    values = params.values() if isinstance(params, dict) else params
+    return [
+        f'{type(value).__name__}[{len(value)}]' if isinstance(value, (list, tuple)) else type(value).__name__
+        for value in values
+    ]
+
+def record_query(query, params, seconds: float, rowcount: int):
+    """Учёт запроса в статистике текущего запроса и лог медленного SQL"""
+    if _request_timing is None:
+        return
+    if not _request_timing['connecting']:
+        timing_add('db', seconds)
+    _request_timing['queries'] += 1
+    _request_timing['rows'] += max(rowcount, 0)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        print(json.dumps({
+            'event': 'slow_query',
+            'function': 'tickets',
+            'ms': round(seconds * 1000, 1),
+            'sql': redact_sql(query),
+            'params': redact_params(params)
+        }))
+
+def _timed_connection_class():
+    """Класс соединения, курсоры которого замеряют каждый execute; создаётся только при включённом REQUEST_TIMING"""
+    global _timed_connection
+    if _timed_connection is None:
+        cursor_classes = {}
+        
+        class TimedConnection(psycopg2.extensions.connection):
+            def cursor(self, *args, **kwargs):
+                factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+                if factory not in cursor_classes:
+                    def execute(cursor, query, params=None, _execute=factory.execute):
+                        started = time.perf_counter()
+                        try:
+                            return _execute(cursor, query, params)
+                        finally:
+                            record_query(query, params, time.perf_counter() - started, cursor.rowcount)
+                    cursor_classes[factory] = type(f'Timed{factory.__name__}', (factory,), {'execute': execute})
+                kwargs['cursor_factory'] = cursor_classes[factory]
+                return super().cursor(*args, **kwargs)
+        
+        _timed_connection = TimedConnection
+    return _timed_connection
+
+def timed_handler(handle):
+    """
+    Замер фаз запроса (connect, db, serialize, compress, остальное - app): заголовок Server-Timing
+    и одна JSON-строка лога на запрос. Без REQUEST_TIMING вызывает handler напрямую.
+    """
+    @functools.wraps(handle)
+    def wrapper(event: dict, context) -> dict:
+        global _request_timing
+        if not REQUEST_TIMING:
+            return handle(event, context)
+        
+        _request_timing = {'phases': {}, 'queries': 0, 'rows': 0, 'connecting': False}
+        started = time.perf_counter()
+        try:
+            response = handle(event, context)
+        finally:
+            timing, _request_timing = _request_timing, None
+        total = time.perf_counter() - started
+        
+        phases = {name: round(seconds * 1000, 1) for name, seconds in timing['phases'].items()}
+        phases['app'] = round(max(total - sum(timing['phases'].values()), 0) * 1000, 1)
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = ', '.join(
+            [f'{name};dur={ms}' for name, ms in phases.items()] + [f'total;dur={total * 1000:.1f}']
+        )
+        headers['Timing-Allow-Origin'] = '*'
+        print(json.dumps({
+            'event': 'request',
+            'function': 'tickets',
+            'method': event.get('httpMethod'),
+            'status': response.get('statusCode'),
+            'ms': round(total * 1000, 1),
+            'phases': phases,
+            'queries': timing['queries'],
+            'rows': timing['rows'],
+            'bytes': len(response.get('body') or ''),
+            'pool': get_pool_stats()
+        }))
+        return response
+    return wrapper
+
+def json_default(value):
+    """Хук json.dumps: даты и время в ISO 8601, Decimal в число"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def serialize(payload) -> str:
+    """json.dumps тела ответа через json_default; время попадает в фазу serialize"""
+    if _request_timing is None:
+        return json.dumps(payload, default=json_default)
+    started = time.perf_counter()
+    body = json.dumps(payload, default=json_default)
+    timing_add('serialize', time.perf_counter() - started)
+    return body
+
+TICKETS_PAGE_SIZE = int(os.environ.get('TICKETS_PAGE_SIZE', '50'))
+TICKETS_MAX_PAGE_SIZE = int(os.environ.get('TICKETS_MAX_PAGE_SIZE', '200'))
+TICKET_STATUSES = ('open', 'answered', 'closed')
+
+def encode_cursor(created_at: datetime, ticket_id: int) -> str:
+    """Непрозрачный курсор страницы: время создания и id последнего тикета"""
+    raw = json.dumps([created_at.isoformat(), ticket_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Разбор курсора, ValueError при некорректном значении"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, ticket_id = json.loads(raw)
+        return datetime.fromisoformat(created_at).isoformat(), int(ticket_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+BULK_MAX_TICKETS = int(os.environ.get('BULK_MAX_TICKETS', '500'))
+
+def bulk_update_tickets(cursor, ticket_ids: list, statuses: list, responses: list) -> list:
+    """Одним запросом меняет статус и ответ поддержки у тикетов и возвращает итог по каждому id"""
+    cursor.execute('''
+        WITH input AS (
+            SELECT * FROM unnest(%s::integer[], %s::text[], %s::text[]) AS i(id, status, admin_response)
+        ), updated AS (
+            UPDATE t_p4903350_kedoo_music_distribu.tickets t
+            SET status = i.status, admin_response = COALESCE(i.admin_response, t.admin_response), updated_at = NOW()
+            FROM input i
+            WHERE t.id = i.id
+            RETURNING t.id
+        )
+        SELECT i.id, CASE WHEN u.id IS NOT NULL THEN 'updated' ELSE 'not_found' END as outcome
+        FROM input i
+        LEFT JOIN updated u ON u.id = i.id
+    ''', (ticket_ids, statuses, responses))
+    return [{'ticket_id': row['id'], 'outcome': row['outcome']} for row in cursor.fetchall()]
+
+def compute_etag(*parts) -> str:
+    """Слабый ETag из параметров запроса и версии данных"""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def etag_matches(event: dict, etag: str) -> bool:
+    """Проверка заголовка If-None-Match (слабое сравнение)"""
+    headers = event.get('headers') or {}
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+def not_modified_response(etag: str) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag'
+        },
+        'body': ''
+    }
+
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def verify_session_token(token: str):
+    """Проверка подписи и срока действия токена без обращения к базе, None если токен недействителен"""
+    payload, _, signature = token.partition('.')
+    if not SESSION_SECRET or not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict) or claims.get('exp', 0) < time.time():
+        return None
+    return claims
+
+REQUIRE_SESSION_TOKEN = os.environ.get('REQUIRE_SESSION_TOKEN') == 'true'
+REVOCATION_REFRESH_SECONDS = float(os.environ.get('REVOCATION_REFRESH_SECONDS', '60'))
+
+_revoked_tokens = {'jti': frozenset(), 'loaded_at': float('-inf')}
+
+STAFF_ROLES = ('admin', 'moderator')
+
+def get_bearer_token(event: dict):
+    headers = event.get('headers') or {}
+    authorization = headers.get('Authorization') or headers.get('authorization') or ''
+    if authorization.startswith('Bearer '):
+        return authorization[len('Bearer '):].strip()
+    return None
+
+def is_token_revoked(cursor, jti: str) -> bool:
+    """Проверка по локальной копии deny-list, которая перечитывается раз в REVOCATION_REFRESH_SECONDS"""
+    if time.monotonic() - _revoked_tokens['loaded_at'] >= REVOCATION_REFRESH_SECONDS:
+        cursor.execute('''
+            SELECT jti FROM t_p4903350_kedoo_music_distribu.revoked_tokens WHERE expires_at > NOW()
+        ''')
+        _revoked_tokens['jti'] = frozenset(row['jti'] for row in cursor.fetchall())
+        _revoked_tokens['loaded_at'] = time.monotonic()
+    return jti in _revoked_tokens['jti']
+
+@timed_handler
 def handler(event: dict, context) -> dict:
     """API для управления тикетами поддержки: создание, получение списка и ответы от администратора"""
     
@@ -14,13 +376,32 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id'
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-User-Id, If-None-Match'
             },
             'body': ''
         }
     
+    conn = None
     try:
-        user_id = event.get('headers', {}).get('X-User-Id') or event.get('headers', {}).get('x-user-id')
+        token = get_bearer_token(event)
+        claims = verify_session_token(token) if token else None
+        
+        if token and not claims:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Invalid or expired session token'})
+            }
+        
+        is_staff = False
+        if claims:
+            user_id = claims['uid']
+            is_staff = claims.get('role') in STAFF_ROLES
+        elif not REQUIRE_SESSION_TOKEN:
+            # Заголовки ничем не подтверждены, поэтому права поддержки даёт только роль из токена
+            user_id = event.get('headers', {}).get('X-User-Id') or event.get('headers', {}).get('x-user-id')
+        else:
+            user_id = None
         
         if not user_id:
             return {
@@ -29,32 +410,108 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'User ID required'})
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if method not in ('GET', 'POST', 'PUT'):
+            return {
+                'statusCode': 405,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Method not allowed'})
+            }
         
+        # Параметры GET проверяются до подключения к базе
         if method == 'GET':
+            params = event.get('queryStringParameters') or {}
+            inbox = params.get('inbox') == 'true'
+            
+            if inbox and not is_staff:
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Staff access required'})
+                }
+            
+            try:
+                limit = min(max(int(params.get('limit') or TICKETS_PAGE_SIZE), 1), TICKETS_MAX_PAGE_SIZE)
+                after = decode_cursor(params['cursor']) if params.get('cursor') else None
+                status_filter = params.get('status', 'open')
+                if inbox and status_filter not in TICKET_STATUSES:
+                    raise ValueError('Invalid status')
+            except (ValueError, TypeError):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid limit, cursor or status'})
+                }
+        
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        
+        if claims and is_token_revoked(cursor, claims['jti']):
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Session revoked'})
+            }
+        
+        if method == 'GET':
+            if inbox:
+                # Общая очередь поддержки: старые обращения первыми, страница по (created_at, id)
+                keyset_condition = 'AND (created_at, id) > (%s::timestamp, %s)' if after else ''
+                cursor.execute(f'''
+                    SELECT * FROM t_p4903350_kedoo_music_distribu.tickets
+                    WHERE status = %s {keyset_condition}
+                    ORDER BY created_at, id
+                    LIMIT %s
+                ''', [status_filter, *(after or ()), limit + 1])
+                
+                tickets = cursor.fetchall()
+                next_cursor = None
+                if len(tickets) > limit:
+                    tickets = tickets[:limit]
+                    next_cursor = encode_cursor(tickets[-1]['created_at'], tickets[-1]['id'])
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': 'no-store'},
+                    'body': serialize({'tickets': tickets, 'next_cursor': next_cursor})
+                }
+            
             cursor.execute('''
-                SELECT * FROM t_p4903350_kedoo_music_distribu.tickets
+                SELECT count(*) as total, max(updated_at) as last_updated, max(id) as last_id
+                FROM t_p4903350_kedoo_music_distribu.tickets
                 WHERE user_id = %s
-                ORDER BY created_at DESC
             ''', (int(user_id),))
+            version = cursor.fetchone()
+            etag = compute_etag(
+                'tickets', user_id, limit, params.get('cursor'),
+                version['total'], version['last_updated'], version['last_id']
+            )
+            if etag_matches(event, etag):
+                return not_modified_response(etag)
             
-            tickets = cursor.fetchall()
-            conn.close()
+            keyset_condition = 'AND (created_at, id) < (%s::timestamp, %s)' if after else ''
+            cursor.execute(f'''
+                SELECT * FROM t_p4903350_kedoo_music_distribu.tickets
+                WHERE user_id = %s {keyset_condition}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            ''', [int(user_id), *(after or ()), limit + 1])
             
-            tickets_list = []
-            for ticket in tickets:
-                ticket_dict = dict(ticket)
-                if ticket_dict['created_at']:
-                    ticket_dict['created_at'] = ticket_dict['created_at'].isoformat()
-                if ticket_dict['updated_at']:
-                    ticket_dict['updated_at'] = ticket_dict['updated_at'].isoformat()
-                tickets_list.append(ticket_dict)
+            tickets = cursor.fetchall()
+            next_cursor = None
+            if len(tickets) > limit:
+                tickets = tickets[:limit]
+                next_cursor = encode_cursor(tickets[-1]['created_at'], tickets[-1]['id'])
             
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'tickets': tickets_list})
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'ETag',
+                    'ETag': etag,
+                    'Cache-Control': 'private, no-cache'
+                },
+                'body': serialize({'tickets': tickets, 'next_cursor': next_cursor})
             }
         
         elif method == 'POST':
@@ -74,7 +531,6 @@ def handler(event: dict, context) -> dict:
             
             ticket_id = cursor.fetchone()['id']
             conn.commit()
-            conn.close()
             
             return {
                 'statusCode': 201,
@@ -86,19 +542,63 @@ def handler(event: dict, context) -> dict:
             body = json.loads(event.get('body', '{}'))
             ticket_id = body.get('id')
             
-            cursor.execute('''
+            if ('ids' in body or 'tickets' in body) and not is_staff:
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Staff access required'})
+                }
+            
+            if 'ids' in body or 'tickets' in body:
+                items = body.get('tickets') or [{'id': tid} for tid in body.get('ids') or []]
+                
+                decisions = {}
+                try:
+                    for item in items:
+                        status = item.get('status') or body.get('status')
+                        if status not in TICKET_STATUSES:
+                            raise ValueError(f'Status must be one of: {", ".join(TICKET_STATUSES)}')
+                        decisions[int(item['id'])] = (status, item.get('admin_response') or body.get('admin_response') or None)
+                    if not decisions or len(decisions) > BULK_MAX_TICKETS:
+                        raise ValueError(f'Between 1 and {BULK_MAX_TICKETS} tickets are required')
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e) if isinstance(e, ValueError) else 'Invalid tickets'})
+                    }
+                
+                results = bulk_update_tickets(
+                    cursor, list(decisions),
+                    [status for status, _ in decisions.values()],
+                    [response for _, response in decisions.values()]
+                )
+                conn.commit()
+                
+                summary = {}
+                for result in results:
+                    summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, 'results': results, 'summary': summary})
+                }
+            
+            # Поддержка отвечает на любой тикет, пользователь - только на свой
+            owner_condition = '' if is_staff else 'AND user_id = %s'
+            cursor.execute(f'''
                 UPDATE t_p4903350_kedoo_music_distribu.tickets 
                 SET status = %s, admin_response = %s, updated_at = NOW()
-                WHERE id = %s AND user_id = %s
+                WHERE id = %s {owner_condition}
             ''', (
                 body.get('status'),
                 body.get('admin_response'),
                 ticket_id,
-                int(user_id)
+                *(() if is_staff else (int(user_id),))
             ))
             
             conn.commit()
-            conn.close()
             
             return {
                 'statusCode': 200,
@@ -106,7 +606,6 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'success': True})
             }
         
-        conn.close()
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -119,3 +618,6 @@ def handler(event: dict, context) -> dict:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        if conn is not None:
+            release_db_connection(conn)
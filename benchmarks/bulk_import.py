@@ -0,0 +1,96 @@
+"""
+Пропускная способность загрузки каталога в релизах в секунду: по одному POST
+на релиз против POST action=import (JSON и NDJSON) с разным размером пачки.
+Запросы идут через handler из backend/releases, как в облачной функции.
+
+Запуск: DATABASE_URL=postgresql://... python benchmarks/bulk_import.py [--releases 500] [--tracks 12]
+Импортированные релизы создаются от отдельного пользователя и удаляются после каждого прогона.
+"""
+import argparse
+import json
+import os
+import time
+
+import psycopg2
+
+from common import load_handler_module
+
+BENCH_USER_ID = 900000001
+CHUNK_SIZES = (25, 100, 500)
+
+def make_releases(count: int, tracks: int) -> list:
+    return [
+        {
+            'title': f'Back catalogue {n}',
+            'upc': f'{n:013d}',
+            'genre': 'Rock',
+            'cover_url': f'https://cdn.example.com/covers/{n}.jpg',
+            'old_release_date': '2015-06-01',
+            'tracks': [
+                {
+                    'title': f'Track {t}',
+                    'audio_url': f'https://cdn.example.com/audio/{n}-{t}.wav',
+                    'music_author': 'Composer',
+                    'lyrics_author': 'Lyricist',
+                    'performers': 'Artist',
+                    'producers': 'Producer',
+                    'isrc': f'RUB01{n:04d}{t:03d}',
+                    'language': 'ru',
+                    'lyrics': 'la ' * 150,
+                }
+                for t in range(1, tracks + 1)
+            ],
+        }
+        for n in range(count)
+    ]
+
+def post(releases, body: str, content_type: str = 'application/json') -> dict:
+    response = releases.handler({
+        'httpMethod': 'POST',
+        'headers': {'X-User-Id': str(BENCH_USER_ID), 'Content-Type': content_type},
+        'body': body,
+    }, None)
+    assert response['statusCode'] in (200, 201), response['body'][:200]
+    return response
+
+def cleanup(dsn: str):
+    conn = psycopg2.connect(dsn)
+    with conn, conn.cursor() as cursor:
+        cursor.execute('''
+            DELETE FROM t_p4903350_kedoo_music_distribu.tracks WHERE release_id IN (
+                SELECT id FROM t_p4903350_kedoo_music_distribu.releases WHERE user_id = %s
+            )
+        ''', (BENCH_USER_ID,))
+        cursor.execute('DELETE FROM t_p4903350_kedoo_music_distribu.releases WHERE user_id = %s', (BENCH_USER_ID,))
+    conn.close()
+
+def measure(dsn: str, label: str, count: int, run):
+    cleanup(dsn)
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    print(f'{label:<28} {elapsed * 1000:>10.1f} {count / elapsed:>12.1f}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--releases', type=int, default=500)
+    parser.add_argument('--tracks', type=int, default=12)
+    args = parser.parse_args()
+
+    dsn = os.environ['DATABASE_URL']
+    releases = load_handler_module('releases')
+    items = make_releases(args.releases, args.tracks)
+
+    print(f'{"mode":<28} {"total, ms":>10} {"releases/s":>12}')
+    measure(dsn, 'POST per release', len(items),
+            lambda: [post(releases, json.dumps(item)) for item in items])
+    for chunk_size in CHUNK_SIZES:
+        measure(dsn, f'import JSON, chunk {chunk_size}', len(items),
+                lambda: post(releases, json.dumps({'action': 'import', 'releases': items, 'chunk_size': chunk_size})))
+    ndjson = '\n'.join(json.dumps(item) for item in items)
+    measure(dsn, 'import NDJSON, chunk 100', len(items),
+            lambda: post(releases, ndjson, 'application/x-ndjson'))
+    cleanup(dsn)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Замер холодного старта облачных функций: время импорта index.py, первого
+ответа на preflight (OPTIONS) и первого раннего отказа (401/405), а также
+отдельно стоимость импорта psycopg2, которую эти пути больше не платят.
+Каждый замер выполняется в новом процессе Python.
+
+Запуск: python benchmarks/cold_start.py [--runs 10] [--json results.json]
+База данных не нужна.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+FUNCTIONS = ('auth', 'releases', 'moderation', 'tickets')
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, {bench_dir!r})
+started = time.perf_counter()
+from common import load_handler_module
+module = load_handler_module({function!r})
+imported = time.perf_counter()
+module.handler({{'httpMethod': 'OPTIONS', 'headers': {{}}}}, None)
+preflight = time.perf_counter()
+response = module.handler({{'httpMethod': 'PATCH', 'headers': {{}}}}, None)
+rejected = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'preflight_ms': (preflight - imported) * 1000,
+    'reject_ms': (rejected - preflight) * 1000,
+    'reject_status': response['statusCode'],
+    'driver_loaded': 'psycopg2' in sys.modules,
+}}))
+'''
+
+DRIVER_PROBE = '''
+import json, time
+started = time.perf_counter()
+import psycopg2.extras, psycopg2.pool
+print(json.dumps({'driver_import_ms': (time.perf_counter() - started) * 1000}))
+'''
+
+def run_probe(code: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', dest='json_path', help='сохранить результаты в файл')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"function":<12} {"import, ms":>11} {"preflight, ms":>14} {"reject, ms":>11} {"status":>7} {"driver":>7}')
+    for function in FUNCTIONS:
+        samples = [run_probe(PROBE.format(bench_dir=BENCH_DIR, function=function)) for _ in range(args.runs)]
+        summary = {key: statistics.median(sample[key] for sample in samples) for key in ('import_ms', 'preflight_ms', 'reject_ms')}
+        summary['reject_status'] = samples[0]['reject_status']
+        summary['driver_loaded'] = any(sample['driver_loaded'] for sample in samples)
+        results[function] = summary
+        print(f'{function:<12} {summary["import_ms"]:>11.2f} {summary["preflight_ms"]:>14.3f} '
+              f'{summary["reject_ms"]:>11.3f} {summary["reject_status"]:>7} {str(summary["driver_loaded"]):>7}')
+
+    try:
+        driver = statistics.median(run_probe(DRIVER_PROBE)['driver_import_ms'] for _ in range(args.runs))
+        results['psycopg2'] = {'driver_import_ms': driver}
+        print(f'psycopg2 import (deferred until first query): {driver:.2f} ms')
+    except subprocess.CalledProcessError:
+        print('psycopg2 is not installed, driver import time not measured')
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
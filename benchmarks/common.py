@@ -0,0 +1,13 @@
+"""Общие утилиты бенчмарков: загрузка index.py облачных функций из backend/"""
+import importlib.util
+import os
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+def load_handler_module(function_name: str):
+    """Загружает backend/<function_name>/index.py как отдельный модуль"""
+    path = os.path.join(BACKEND_DIR, function_name, 'index.py')
+    spec = importlib.util.spec_from_file_location(f'{function_name}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
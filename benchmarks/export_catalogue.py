@@ -0,0 +1,44 @@
+"""
+Выгрузка каталога в локальный файл целиком (NDJSON или CSV, .gz сжимается)
+через iter_catalogue/write_catalogue_export облачной функции, с замером
+скорости и пикового RSS процесса: память не должна зависеть от размера каталога.
+
+Запуск:
+    DATABASE_URL=postgresql://... python benchmarks/export_catalogue.py catalogue.ndjson.gz [--user 42] [--format csv]
+Без --user выгружается весь каталог платформы (как для модераторов).
+"""
+import argparse
+import gzip
+import os
+import resource
+import time
+
+import psycopg2
+
+from common import load_handler_module
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output')
+    parser.add_argument('--user', type=int, help='выгрузить только релизы пользователя')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    args = parser.parse_args()
+
+    releases = load_handler_module('releases')
+    releases.load_db_driver()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    opener = gzip.open if args.output.endswith('.gz') else open
+    started = time.perf_counter()
+    try:
+        with opener(args.output, 'wt', encoding='utf-8', newline='') as text:
+            count, _, _ = releases.write_catalogue_export(text, args.format, releases.iter_catalogue(conn, args.user))
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    size_mb = os.path.getsize(args.output) / 1024 / 1024
+    print(f'{count} releases, {size_mb:.1f} MB in {elapsed:.1f}s ({count / elapsed:.0f} releases/s), peak RSS {peak_mb:.0f} MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Нагрузочный прогон облачных функций по сценариям из backend/<функция>/tests.json
+против локального PostgreSQL с синтетическим каталогом.
+
+Для каждого сценария считаются холодная (первый запрос после загрузки модуля,
+включая подключение) и тёплая задержка p50/p95/p99, число SQL-запросов на
+запрос и размер ответа. Результаты сохраняются в JSON для сравнения коммитов.
+Если сценарий задаёт expectedHeaders или expectedIsBase64Encoded, расхождения
+отмечаются в отчёте так же, как неожиданный статус. Ключ env задаёт переменные
+окружения, с которыми модуль функции загружается для этого сценария
+(например REQUEST_TIMING); вывод функции в таких сценариях подавляется.
+
+Подготовка базы (пересоздаёт схему, применяет db_migrations и заполняет данные):
+    DATABASE_URL=postgresql://localhost/kedoo_bench python benchmarks/harness.py --setup \\
+        --users 200 --releases-per-user 50 --tracks-per-release 12 --tickets-per-user 5
+
+Прогон и сравнение с предыдущим результатом:
+    DATABASE_URL=... python benchmarks/harness.py --warm-runs 200 --output results/new.json \\
+        --compare results/old.json
+"""
+import argparse
+import contextlib
+import glob
+import json
+import math
+import os
+import subprocess
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from common import BACKEND_DIR, load_handler_module
+
+SCHEMA = 't_p4903350_kedoo_music_distribu'
+FUNCTIONS = ('auth', 'releases', 'moderation', 'tickets')
+MIGRATIONS_DIR = os.path.join(BACKEND_DIR, '..', 'db_migrations')
+
+SEED_SQL = '''
+INSERT INTO users (email, password, name, role)
+SELECT 'user' || g || '@bench.local', encode(sha256('bench'::bytea), 'hex'), 'User ' || g, 'user'
+FROM generate_series(1, %(users)s) g;
+
+INSERT INTO releases (user_id, title, upc, genre, cover_url, old_release_date, new_release_date,
+                      status, rejection_reason, created_at, updated_at, trash_status)
+SELECT u.id,
+       'Release ' || u.id || '-' || g,
+       lpad((u.id * 100000 + g)::text, 12, '0'),
+       (ARRAY['Pop', 'Rock', 'Hip-Hop', 'Electronic'])[1 + g %% 4],
+       'https://cdn.example.com/covers/' || u.id || '-' || g || '.jpg',
+       DATE '2023-01-01' + g %% 365,
+       CURRENT_DATE + g %% 120,
+       (ARRAY['pending', 'approved', 'rejected'])[1 + (u.id + g) %% 3],
+       CASE WHEN (u.id + g) %% 3 = 2 THEN 'Низкое качество обложки' END,
+       NOW() - (g || ' hours')::interval,
+       NOW() - (g || ' hours')::interval,
+       CASE WHEN g %% 20 = 0 THEN NOW() - (g || ' minutes')::interval END
+FROM users u CROSS JOIN generate_series(1, %(releases_per_user)s) g;
+
+INSERT INTO tracks (release_id, title, audio_url, music_author, lyrics_author, has_explicit,
+                    performers, producers, isrc, language, track_order, lyrics, is_instrumental)
+SELECT r.id, 'Track ' || n, 'https://cdn.example.com/audio/' || r.id || '-' || n || '.wav',
+       'Composer', 'Lyricist', n %% 7 = 0, 'Artist feat. Guest ' || n, 'Producer',
+       'RUA01' || lpad((r.id * 100 + n)::text, 7, '0'), 'ru', n, repeat('la ', 150), n %% 9 = 0
+FROM releases r CROSS JOIN generate_series(1, %(tracks_per_release)s) n;
+
+INSERT INTO tickets (user_id, subject, message, status, created_at, updated_at)
+SELECT u.id, 'Вопрос ' || g, 'Текст обращения ' || g,
+       (ARRAY['open', 'answered', 'closed'])[1 + g %% 3],
+       NOW() - (g || ' days')::interval, NOW() - (g || ' days')::interval
+FROM users u CROSS JOIN generate_series(1, %(tickets_per_user)s) g;
+'''
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """Соединение, которое считает выполненные через его курсоры запросы"""
+    queries = 0
+    _cursor_classes = {}
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        if factory not in self._cursor_classes:
+            def execute(cursor, query, params=None):
+                CountingConnection.queries += 1
+                return factory.execute(cursor, query, params)
+            self._cursor_classes[factory] = type(f'Counting{factory.__name__}', (factory,), {'execute': execute})
+        kwargs['cursor_factory'] = self._cursor_classes[factory]
+        return super().cursor(*args, **kwargs)
+
+
+def setup_database(dsn: str, sizes: dict):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        # auth обращается к users без схемы, как на боевой базе
+        cur.execute(f'ALTER DATABASE {conn.info.dbname} SET search_path TO {SCHEMA}, public')
+        cur.execute(f'SET search_path TO {SCHEMA}, public')
+        for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, 'V*.sql'))):
+            with open(path) as f:
+                cur.execute(f.read())
+        started = time.perf_counter()
+        cur.execute(SEED_SQL, sizes)
+        cur.execute('ANALYZE')
+        cur.execute('SELECT (SELECT count(*) FROM releases), (SELECT count(*) FROM tracks), (SELECT count(*) FROM tickets)')
+        releases, tracks, tickets = cur.fetchone()
+    conn.close()
+    print(f'seeded {releases} releases, {tracks} tracks, {tickets} tickets in {time.perf_counter() - started:.1f}s')
+
+
+def build_event(test: dict) -> dict:
+    url = urlsplit(test.get('path', '/'))
+    return {
+        'httpMethod': test.get('method', 'GET'),
+        'headers': dict(test.get('headers') or {}),
+        'queryStringParameters': dict(parse_qsl(url.query)) or None,
+        'body': json.dumps(test['body']) if 'body' in test else '{}',
+    }
+
+
+def header_mismatches(test: dict, response: dict) -> list:
+    """Расхождения с expectedHeaders и expectedIsBase64Encoded сценария; "string" - любое значение"""
+    problems = []
+    headers = response.get('headers') or {}
+    for name, expected in (test.get('expectedHeaders') or {}).items():
+        actual = headers.get(name)
+        if actual is None or (expected != 'string' and actual != expected):
+            problems.append(f'{name}={actual}')
+    if 'expectedIsBase64Encoded' in test and bool(response.get('isBase64Encoded')) != test['expectedIsBase64Encoded']:
+        problems.append(f'isBase64Encoded={bool(response.get("isBase64Encoded"))}')
+    return problems
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples: list) -> dict:
+    return {f'p{pct}': round(percentile(samples, pct) * 1000, 3) for pct in (50, 95, 99)}
+
+
+def counting_pool(original_pool):
+    """Пул, соединения которого считают запросы; класс соединения функции (REQUEST_TIMING) сохраняется"""
+    def create(*args, **kwargs):
+        factory = kwargs.pop('connection_factory', None)
+        if factory is not None:
+            factory = type(f'Counting{factory.__name__}', (CountingConnection, factory), {})
+        return original_pool(*args, connection_factory=factory or CountingConnection, **kwargs)
+    return create
+
+
+@contextlib.contextmanager
+def scenario_env(test: dict):
+    """Переменные окружения из ключа env сценария на время загрузки модуля и вызовов"""
+    env = test.get('env') or {}
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        with contextlib.ExitStack() as stack:
+            if env:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def call(module, event: dict) -> tuple:
+    CountingConnection.queries = 0
+    started = time.perf_counter()
+    response = module.handler(json.loads(json.dumps(event)), None)
+    return time.perf_counter() - started, response, CountingConnection.queries
+
+
+def run_function(function: str, cold_runs: int, warm_runs: int) -> dict:
+    with open(os.path.join(BACKEND_DIR, function, 'tests.json')) as f:
+        tests = json.load(f)['tests']
+
+    results = {}
+    for test in tests:
+        event = build_event(test)
+        cold, warm, queries, sizes, statuses, mismatches = [], [], [], [], set(), set()
+        for _ in range(cold_runs):
+            with scenario_env(test):
+                module = load_handler_module(function)
+                elapsed, response, _ = call(module, event)
+                cold.append(elapsed)
+                for _ in range(warm_runs // cold_runs):
+                    elapsed, response, query_count = call(module, event)
+                    warm.append(elapsed)
+                    queries.append(query_count)
+                    sizes.append(len(response.get('body') or ''))
+                    statuses.add(response['statusCode'])
+                    mismatches.update(header_mismatches(test, response))
+            if module._pool is not None:
+                module._pool.closeall()
+        results[test['name']] = {
+            'expected_status': test.get('expectedStatus'),
+            'statuses': sorted(statuses),
+            'header_mismatches': sorted(mismatches),
+            'cold_ms': latency_summary(cold),
+            'warm_ms': latency_summary(warm),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'bytes': round(sum(sizes) / len(sizes)),
+        }
+    return results
+
+
+def print_report(results: dict, baseline: dict = None):
+    print(f'{"scenario":<58} {"status":>8} {"cold p50":>9} {"warm p50":>9} {"p95":>8} {"p99":>8} {"queries":>8} {"bytes":>9}')
+    for function, scenarios in results['functions'].items():
+        for name, row in scenarios.items():
+            status = ','.join(str(code) for code in row['statuses'])
+            if row['expected_status'] not in row['statuses'] or row.get('header_mismatches'):
+                status += '!'
+            line = (f'{function + ": " + name:<58.58} {status:>8} {row["cold_ms"]["p50"]:>9.2f} '
+                    f'{row["warm_ms"]["p50"]:>9.2f} {row["warm_ms"]["p95"]:>8.2f} {row["warm_ms"]["p99"]:>8.2f} '
+                    f'{row["queries_per_request"]:>8} {row["bytes"]:>9}')
+            previous = (baseline or {}).get('functions', {}).get(function, {}).get(name)
+            if previous:
+                delta = (row['warm_ms']['p50'] - previous['warm_ms']['p50']) / max(previous['warm_ms']['p50'], 1e-9) * 100
+                line += f'  warm p50 {delta:+.1f}%'
+            if row.get('header_mismatches'):
+                line += f'  headers: {", ".join(row["header_mismatches"])}'
+            print(line)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=BACKEND_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--setup', action='store_true', help='пересоздать схему и заполнить синтетическими данными')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--releases-per-user', type=int, default=20)
+    parser.add_argument('--tracks-per-release', type=int, default=10)
+    parser.add_argument('--tickets-per-user', type=int, default=5)
+    parser.add_argument('--functions', nargs='*', default=FUNCTIONS, choices=FUNCTIONS)
+    parser.add_argument('--cold-runs', type=int, default=5)
+    parser.add_argument('--warm-runs', type=int, default=100)
+    parser.add_argument('--output', help='файл для результатов (по умолчанию results/<коммит>.json)')
+    parser.add_argument('--compare', help='файл предыдущих результатов для сравнения')
+    args = parser.parse_args()
+
+    dsn = os.environ['DATABASE_URL']
+    if args.setup:
+        setup_database(dsn, {
+            'users': args.users,
+            'releases_per_user': args.releases_per_user,
+            'tracks_per_release': args.tracks_per_release,
+            'tickets_per_user': args.tickets_per_user,
+        })
+
+    # Пулы функций создают соединения через CountingConnection
+    original_pool = psycopg2.pool.ThreadedConnectionPool
+    psycopg2.pool.ThreadedConnectionPool = counting_pool(original_pool)
+
+    revision = git_revision()
+    results = {'revision': revision, 'cold_runs': args.cold_runs, 'warm_runs': args.warm_runs, 'functions': {}}
+    for function in args.functions:
+        results['functions'][function] = run_function(function, args.cold_runs, max(args.warm_runs, args.cold_runs))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', f'{revision}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f'results saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Проверка планов запросов облачных функций: прогоняет сценарии из
+backend/<функция>/tests.json против засеянной базы (см. harness.py --setup),
+перехватывает каждый SELECT/UPDATE/DELETE и выполняет для него EXPLAIN.
+
+Соединения открываются с enable_seqscan=off и enable_sort=off, поэтому
+Seq Scan или Sort в плане означают, что подходящего индекса нет вообще,
+а не что планировщику так дешевле на маленькой базе. Завершается с кодом 1,
+если хотя бы один запрос сканирует таблицу целиком или сортирует явно
+(кроме перечисленных в ALLOWED_SORTS).
+
+Запуск:
+    DATABASE_URL=postgresql://localhost/kedoo_bench python benchmarks/query_plans.py [--verbose]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from common import BACKEND_DIR, load_handler_module
+from harness import FUNCTIONS, build_event
+
+EXPLAINED_STATEMENTS = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE)\b', re.IGNORECASE)
+
+# Сортировки, которые индекс обслужить не может: ранг полнотекстового поиска
+# вычисляется на лету, выборка по списку id упорядочивается после поиска по ключу,
+# а продление аренды сортирует только релизы, уже взятые одним модератором
+ALLOWED_SORTS = (
+    re.compile(r'ORDER BY rank DESC'),
+    re.compile(r'WHERE p\.id = ANY\(%s\)'),
+    re.compile(r'WHERE claimed_by = %s AND claim_expires_at > NOW\(\)'),
+)
+
+plans = {}
+
+
+class ExplainingConnection(psycopg2.extensions.connection):
+    """Соединение, которое перед каждым читающим/изменяющим запросом сохраняет его план"""
+    _cursor_classes = {}
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        if factory not in self._cursor_classes:
+            def execute(cursor, query, params=None):
+                text = query.decode() if isinstance(query, bytes) else query
+                if EXPLAINED_STATEMENTS.match(text):
+                    key = ' '.join(text.split())
+                    if key not in plans:
+                        with psycopg2.extensions.cursor(cursor.connection) as plain:
+                            plain.execute('EXPLAIN (FORMAT JSON) ' + text, params)
+                            plans[key] = plain.fetchone()[0][0]['Plan']
+                return factory.execute(cursor, query, params)
+            self._cursor_classes[factory] = type(f'Explaining{factory.__name__}', (factory,), {'execute': execute})
+        kwargs['cursor_factory'] = self._cursor_classes[factory]
+        return super().cursor(*args, **kwargs)
+
+
+def walk(plan: dict):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def violations(query: str, plan: dict) -> list:
+    problems = []
+    for node in walk(plan):
+        if node['Node Type'] == 'Seq Scan':
+            problems.append(f'Seq Scan on {node["Relation Name"]}')
+        elif node['Node Type'] in ('Sort', 'Incremental Sort') and not any(p.search(query) for p in ALLOWED_SORTS):
+            problems.append(f'{node["Node Type"]} by {", ".join(node.get("Sort Key", []))}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--functions', nargs='*', default=FUNCTIONS, choices=FUNCTIONS)
+    parser.add_argument('--verbose', action='store_true', help='печатать планы всех запросов')
+    args = parser.parse_args()
+
+    original_pool = psycopg2.pool.ThreadedConnectionPool
+    psycopg2.pool.ThreadedConnectionPool = lambda *a, **kw: original_pool(
+        *a, connection_factory=ExplainingConnection, options='-c enable_seqscan=off -c enable_sort=off', **kw
+    )
+
+    for function in args.functions:
+        with open(os.path.join(BACKEND_DIR, function, 'tests.json')) as f:
+            tests = json.load(f)['tests']
+        module = load_handler_module(function)
+        for test in tests:
+            module.handler(build_event(test), None)
+        if module._pool is not None:
+            module._pool.closeall()
+
+    failed = 0
+    for query, plan in plans.items():
+        problems = violations(query, plan)
+        if problems or args.verbose:
+            print(query[:160])
+            for problem in problems:
+                print(f'    FAIL: {problem}')
+            if args.verbose:
+                print(json.dumps(plan, indent=2))
+        failed += bool(problems)
+
+    print(f'{len(plans)} queries explained, {failed} with sequential scans or explicit sorts')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
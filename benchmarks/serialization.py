@@ -0,0 +1,73 @@
+"""
+Бенчмарк сериализации списка релизов: строки из RealDictCursor, которые psycopg2
+разбирает (включая json_agg треков) и json.dumps кодирует заново с хуком json_default,
+против строк, собранных в JSON самим PostgreSQL через row_to_json и склеенных
+serialize_rows из backend/releases.
+
+Время меряется от запроса до готового тела ответа (fetch + body) и отдельно
+для шага сборки тела в Python, в пересчёте на 1000 релизов.
+
+Запуск: DATABASE_URL=postgresql://localhost/kedoo_bench python benchmarks/serialization.py [--releases 1000] [--repeat 20]
+Нужна база, засеянная harness.py --setup.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from common import load_handler_module
+
+def measure(conn, query: str, limit: int, build_body, repeat: int) -> tuple:
+    total, body_only = [], []
+    for _ in range(repeat):
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            started = time.perf_counter()
+            cursor.execute(query, (limit,))
+            rows = cursor.fetchall()
+            fetched = time.perf_counter()
+            body = build_body(rows)
+            finished = time.perf_counter()
+        conn.rollback()
+        total.append(finished - started)
+        body_only.append(finished - fetched)
+    return statistics.median(total) * 1000, statistics.median(body_only) * 1000, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--releases', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    releases = load_handler_module('releases')
+    releases.load_db_driver()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    scale = 1000 / args.releases
+    try:
+        print(f'{"view":<8} {"path":<12} {"total, ms":>10} {"body, ms":>10} {"bytes":>10}')
+        for view, tracks_column, tracks_alias in (
+            ('compact', releases.TRACK_COUNT_SQL, 'track_count'),
+            ('full', releases.TRACKS_JSON_SQL, 'tracks'),
+        ):
+            select_sql = f'''
+                SELECT {releases.RELEASE_COLUMNS_SQL}, ({tracks_column}) as {tracks_alias}
+                FROM t_p4903350_kedoo_music_distribu.releases p
+                ORDER BY p.id
+                LIMIT %s
+            '''
+            paths = (
+                ('json.dumps', select_sql,
+                 lambda rows: releases.serialize({'releases': rows})),
+                ('row_to_json', f'SELECT row_to_json(page)::text as release_json FROM ({select_sql}) page',
+                 lambda rows: releases.serialize_rows('releases', [row['release_json'] for row in rows])),
+            )
+            for label, query, build_body in paths:
+                total, body_only, size = measure(conn, query, args.releases, build_body, args.repeat)
+                print(f'{view:<8} {label:<12} {total * scale:>10.2f} {body_only * scale:>10.2f} {size:>10}')
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
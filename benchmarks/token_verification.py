@@ -0,0 +1,40 @@
+"""
+Бенчмарк проверки токена сессии на запрос: HMAC-подпись, разбор claims,
+срок действия и поиск jti в локальном deny-list (как в backend/releases).
+
+Запуск: python benchmarks/token_verification.py [--iterations 100000] [--revoked 10000]
+База данных не нужна.
+"""
+import argparse
+import os
+import secrets
+import time
+
+os.environ.setdefault('SESSION_SECRET', secrets.token_hex(32))
+
+from common import load_handler_module
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--revoked', type=int, default=10000, help='размер deny-list')
+    args = parser.parse_args()
+
+    auth = load_handler_module('auth')
+    releases = load_handler_module('releases')
+    token = auth.issue_session_token(42, 'user')
+    event = {'headers': {'Authorization': f'Bearer {token}'}}
+    revoked = frozenset(secrets.token_hex(8) for _ in range(args.revoked))
+
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        claims = releases.verify_session_token(releases.get_bearer_token(event))
+        if claims is None or claims['jti'] in revoked:
+            raise SystemExit('token rejected')
+    elapsed = time.perf_counter() - started
+
+    print(f'token length: {len(token)} bytes, deny-list: {args.revoked} entries')
+    print(f'verification: {elapsed / args.iterations * 1e6:.2f} us per request')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Микробенчмарк вставки треков: по одному INSERT на трек против одного
+многострочного INSERT (insert_tracks из backend/releases).
+
+Запуск: DATABASE_URL=postgresql://... python benchmarks/track_inserts.py [--repeat 20]
+Каждая попытка выполняется в транзакции и откатывается, данные не сохраняются.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from common import load_handler_module
+
+TRACK_COUNTS = (1, 10, 50, 100, 500)
+
+def make_tracks(count: int) -> list:
+    return [
+        {
+            'title': f'Track {n}',
+            'audio_url': f'https://cdn.example.com/audio/{n}.wav',
+            'music_author': 'Composer',
+            'lyrics_author': 'Lyricist',
+            'performers': 'Artist feat. Guest',
+            'producers': 'Producer',
+            'isrc': f'RUA012400{n:03d}',
+            'language': 'ru',
+            'lyrics': 'la ' * 200,
+        }
+        for n in range(count)
+    ]
+
+def insert_per_row(cursor, releases, release_id: int, tracks: list):
+    for idx, track in enumerate(tracks):
+        cursor.execute(
+            releases.TRACK_INSERT_SQL % releases.TRACK_INSERT_TEMPLATE,
+            releases.track_row(release_id, track, idx + 1)
+        )
+
+def measure(conn, insert, tracks: list, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            started = time.perf_counter()
+            insert(cursor, tracks)
+            timings.append(time.perf_counter() - started)
+        conn.rollback()
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    releases = load_handler_module('releases')
+    releases.load_db_driver()
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        print(f'{"tracks":>6}  {"per-row, ms":>12}  {"batched, ms":>12}  {"speedup":>8}')
+        for count in TRACK_COUNTS:
+            tracks = make_tracks(count)
+            per_row = measure(conn, lambda cur, t: insert_per_row(cur, releases, 0, t), tracks, args.repeat)
+            batched = measure(conn, lambda cur, t: releases.insert_tracks(cur, 0, t), tracks, args.repeat)
+            print(f'{count:>6}  {per_row:>12.2f}  {batched:>12.2f}  {per_row / batched:>7.1f}x')
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
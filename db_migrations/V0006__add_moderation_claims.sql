@@ -0,0 +1,5 @@
+ALTER TABLE t_p4903350_kedoo_music_distribu.releases ADD COLUMN IF NOT EXISTS claimed_by INTEGER;
+ALTER TABLE t_p4903350_kedoo_music_distribu.releases ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMP WITHOUT TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_releases_moderation_queue ON t_p4903350_kedoo_music_distribu.releases(new_release_date NULLS LAST, created_at, id) WHERE status = 'pending' AND trash_status IS NULL;
+CREATE INDEX IF NOT EXISTS idx_releases_claimed_by ON t_p4903350_kedoo_music_distribu.releases(claimed_by) WHERE claimed_by IS NOT NULL;
@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS t_p4903350_kedoo_music_distribu.revoked_tokens (
+    jti VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    revoked_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON t_p4903350_kedoo_music_distribu.revoked_tokens(expires_at);
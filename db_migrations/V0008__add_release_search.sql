@@ -0,0 +1,68 @@
+ALTER TABLE t_p4903350_kedoo_music_distribu.releases ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+-- Поисковый вектор релиза: название и треки с весами, конфигурация simple подходит и для русского, и для латиницы
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.release_search_vector(p_release_id INTEGER, p_title TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_title, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(string_agg(t.title, ' '), '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(string_agg(concat_ws(' ', t.performers, t.producers), ' '), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(string_agg(t.lyrics, ' '), '')), 'D')
+    FROM t_p4903350_kedoo_music_distribu.tracks t
+    WHERE t.release_id = p_release_id
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.releases_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := t_p4903350_kedoo_music_distribu.release_search_vector(NEW.id, NEW.title);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- Треки пересчитывают вектор затронутых релизов один раз на оператор, а не на каждую строку
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.tracks_search_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE t_p4903350_kedoo_music_distribu.releases r
+        SET search_vector = t_p4903350_kedoo_music_distribu.release_search_vector(r.id, r.title)
+        WHERE r.id IN (SELECT DISTINCT release_id FROM old_tracks);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'INSERT') THEN
+        UPDATE t_p4903350_kedoo_music_distribu.releases r
+        SET search_vector = t_p4903350_kedoo_music_distribu.release_search_vector(r.id, r.title)
+        WHERE r.id IN (SELECT DISTINCT release_id FROM new_tracks);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS releases_search_update ON t_p4903350_kedoo_music_distribu.releases;
+CREATE TRIGGER releases_search_update
+    BEFORE INSERT OR UPDATE OF title ON t_p4903350_kedoo_music_distribu.releases
+    FOR EACH ROW EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.releases_search_trigger();
+
+DROP TRIGGER IF EXISTS tracks_search_insert ON t_p4903350_kedoo_music_distribu.tracks;
+CREATE TRIGGER tracks_search_insert
+    AFTER INSERT ON t_p4903350_kedoo_music_distribu.tracks
+    REFERENCING NEW TABLE AS new_tracks
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.tracks_search_trigger();
+
+DROP TRIGGER IF EXISTS tracks_search_update ON t_p4903350_kedoo_music_distribu.tracks;
+CREATE TRIGGER tracks_search_update
+    AFTER UPDATE ON t_p4903350_kedoo_music_distribu.tracks
+    REFERENCING OLD TABLE AS old_tracks NEW TABLE AS new_tracks
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.tracks_search_trigger();
+
+DROP TRIGGER IF EXISTS tracks_search_delete ON t_p4903350_kedoo_music_distribu.tracks;
+CREATE TRIGGER tracks_search_delete
+    AFTER DELETE ON t_p4903350_kedoo_music_distribu.tracks
+    REFERENCING OLD TABLE AS old_tracks
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.tracks_search_trigger();
+
+UPDATE t_p4903350_kedoo_music_distribu.releases
+SET search_vector = t_p4903350_kedoo_music_distribu.release_search_vector(id, title);
+
+CREATE INDEX IF NOT EXISTS idx_releases_search_vector ON t_p4903350_kedoo_music_distribu.releases USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_releases_upc ON t_p4903350_kedoo_music_distribu.releases(upc) WHERE upc IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_tracks_isrc ON t_p4903350_kedoo_music_distribu.tracks(isrc) WHERE isrc IS NOT NULL;
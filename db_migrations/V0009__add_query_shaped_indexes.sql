@@ -0,0 +1,20 @@
+-- Список релизов артиста: user_id + trash_status IS NULL, сортировка created_at DESC, id DESC (keyset-пагинация)
+CREATE INDEX IF NOT EXISTS idx_releases_user_active ON t_p4903350_kedoo_music_distribu.releases(user_id, created_at DESC, id DESC) WHERE trash_status IS NULL;
+
+-- Корзина артиста: сортировка по времени удаления
+CREATE INDEX IF NOT EXISTS idx_releases_user_trash ON t_p4903350_kedoo_music_distribu.releases(user_id, trash_status DESC, id DESC) WHERE trash_status IS NOT NULL;
+
+-- Очередь модерации по статусу, новые сверху
+CREATE INDEX IF NOT EXISTS idx_releases_status_active ON t_p4903350_kedoo_music_distribu.releases(status, created_at DESC) WHERE trash_status IS NULL;
+
+-- Треки релиза сразу в порядке track_order для агрегации в JSON
+CREATE INDEX IF NOT EXISTS idx_tracks_release_order ON t_p4903350_kedoo_music_distribu.tracks(release_id, track_order);
+
+-- Обращения пользователя, новые сверху
+CREATE INDEX IF NOT EXISTS idx_tickets_user_created ON t_p4903350_kedoo_music_distribu.tickets(user_id, created_at DESC);
+
+-- Одноколоночные индексы полностью перекрыты составными выше и только замедляют запись
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_releases_user_id;
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_releases_status;
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_tracks_release_id;
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_tickets_user_id;
@@ -0,0 +1,73 @@
+CREATE TABLE IF NOT EXISTS t_p4903350_kedoo_music_distribu.release_status_counts (
+    user_id INTEGER NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    in_trash BOOLEAN NOT NULL,
+    release_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, status, in_trash)
+);
+
+-- Счётчики меняются суммарной разностью за оператор: изменения, не затронувшие статус или корзину,
+-- не трогают строки счётчиков, а ключи обновляются в фиксированном порядке, чтобы параллельные
+-- массовые модерации не приводили к взаимоблокировкам
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.release_status_counts_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts AS c (user_id, status, in_trash, release_count)
+        SELECT d.user_id, d.status, d.in_trash, sum(d.delta)
+        FROM (SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, 1 as delta FROM new_releases) d
+        GROUP BY d.user_id, d.status, d.in_trash
+        HAVING sum(d.delta) <> 0
+        ORDER BY d.user_id, d.status, d.in_trash
+        ON CONFLICT (user_id, status, in_trash) DO UPDATE SET release_count = c.release_count + EXCLUDED.release_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts AS c (user_id, status, in_trash, release_count)
+        SELECT d.user_id, d.status, d.in_trash, sum(d.delta)
+        FROM (SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, -1 as delta FROM old_releases) d
+        GROUP BY d.user_id, d.status, d.in_trash
+        HAVING sum(d.delta) <> 0
+        ORDER BY d.user_id, d.status, d.in_trash
+        ON CONFLICT (user_id, status, in_trash) DO UPDATE SET release_count = c.release_count + EXCLUDED.release_count;
+    ELSE
+        INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts AS c (user_id, status, in_trash, release_count)
+        SELECT d.user_id, d.status, d.in_trash, sum(d.delta)
+        FROM (SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, 1 as delta FROM new_releases
+              UNION ALL
+              SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, -1 as delta FROM old_releases) d
+        GROUP BY d.user_id, d.status, d.in_trash
+        HAVING sum(d.delta) <> 0
+        ORDER BY d.user_id, d.status, d.in_trash
+        ON CONFLICT (user_id, status, in_trash) DO UPDATE SET release_count = c.release_count + EXCLUDED.release_count;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Пересчёт и установка триггеров под блокировкой, чтобы ни одно изменение не прошло мимо счётчиков
+LOCK TABLE t_p4903350_kedoo_music_distribu.releases IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS releases_counts_insert ON t_p4903350_kedoo_music_distribu.releases;
+CREATE TRIGGER releases_counts_insert
+    AFTER INSERT ON t_p4903350_kedoo_music_distribu.releases
+    REFERENCING NEW TABLE AS new_releases
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.release_status_counts_trigger();
+
+DROP TRIGGER IF EXISTS releases_counts_update ON t_p4903350_kedoo_music_distribu.releases;
+CREATE TRIGGER releases_counts_update
+    AFTER UPDATE ON t_p4903350_kedoo_music_distribu.releases
+    REFERENCING OLD TABLE AS old_releases NEW TABLE AS new_releases
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.release_status_counts_trigger();
+
+DROP TRIGGER IF EXISTS releases_counts_delete ON t_p4903350_kedoo_music_distribu.releases;
+CREATE TRIGGER releases_counts_delete
+    AFTER DELETE ON t_p4903350_kedoo_music_distribu.releases
+    REFERENCING OLD TABLE AS old_releases
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.release_status_counts_trigger();
+
+DELETE FROM t_p4903350_kedoo_music_distribu.release_status_counts;
+INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts (user_id, status, in_trash, release_count)
+SELECT user_id, COALESCE(status, 'draft'), trash_status IS NOT NULL, count(*)
+FROM t_p4903350_kedoo_music_distribu.releases
+GROUP BY user_id, COALESCE(status, 'draft'), trash_status IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_release_status_counts_status ON t_p4903350_kedoo_music_distribu.release_status_counts(status) WHERE NOT in_trash;
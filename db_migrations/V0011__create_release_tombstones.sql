@@ -0,0 +1,27 @@
+CREATE TABLE IF NOT EXISTS t_p4903350_kedoo_music_distribu.release_tombstones (
+    release_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_release_tombstones_user_deleted ON t_p4903350_kedoo_music_distribu.release_tombstones(user_id, deleted_at);
+
+-- Надгробия пишутся для любого окончательного удаления: из API и из очистки корзины
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.release_tombstones_trigger()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO t_p4903350_kedoo_music_distribu.release_tombstones (release_id, user_id)
+    SELECT id, user_id FROM old_releases
+    ON CONFLICT (release_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS releases_tombstones_delete ON t_p4903350_kedoo_music_distribu.releases;
+CREATE TRIGGER releases_tombstones_delete
+    AFTER DELETE ON t_p4903350_kedoo_music_distribu.releases
+    REFERENCING OLD TABLE AS old_releases
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.release_tombstones_trigger();
+
+-- Изменения артиста с момента последней синхронизации
+CREATE INDEX IF NOT EXISTS idx_releases_user_updated ON t_p4903350_kedoo_music_distribu.releases(user_id, updated_at, id) WHERE trash_status IS NULL;
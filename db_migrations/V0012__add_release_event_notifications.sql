@@ -0,0 +1,40 @@
+-- Уведомления об изменениях релизов для long-poll: отправляются при коммите транзакции,
+-- служебные обновления (поисковый вектор, захват модератором) не публикуются
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.release_events_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('release_events', json_build_object(
+            'event', 'created', 'release_id', n.id, 'user_id', n.user_id, 'status', n.status
+        )::text)
+        FROM new_releases n;
+    ELSE
+        PERFORM pg_notify('release_events', json_build_object(
+            'event', CASE
+                WHEN o.trash_status IS NULL AND n.trash_status IS NOT NULL THEN 'trashed'
+                WHEN o.trash_status IS NOT NULL AND n.trash_status IS NULL THEN 'restored'
+                WHEN n.status IS DISTINCT FROM o.status AND n.status IN ('approved', 'rejected') THEN 'moderated'
+                ELSE 'updated'
+            END,
+            'release_id', n.id, 'user_id', n.user_id, 'status', n.status
+        )::text)
+        FROM new_releases n JOIN old_releases o ON o.id = n.id
+        WHERE n.status IS DISTINCT FROM o.status
+           OR n.updated_at IS DISTINCT FROM o.updated_at
+           OR n.trash_status IS DISTINCT FROM o.trash_status;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS releases_events_insert ON t_p4903350_kedoo_music_distribu.releases;
+CREATE TRIGGER releases_events_insert
+    AFTER INSERT ON t_p4903350_kedoo_music_distribu.releases
+    REFERENCING NEW TABLE AS new_releases
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.release_events_trigger();
+
+DROP TRIGGER IF EXISTS releases_events_update ON t_p4903350_kedoo_music_distribu.releases;
+CREATE TRIGGER releases_events_update
+    AFTER UPDATE ON t_p4903350_kedoo_music_distribu.releases
+    REFERENCING OLD TABLE AS old_releases NEW TABLE AS new_releases
+    FOR EACH STATEMENT EXECUTE FUNCTION t_p4903350_kedoo_music_distribu.release_events_trigger();
@@ -0,0 +1,8 @@
+-- Обращения пользователя постранично: created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_tickets_user_keyset ON t_p4903350_kedoo_music_distribu.tickets(user_id, created_at DESC, id DESC);
+
+-- Общая очередь поддержки по статусу, старые сверху
+CREATE INDEX IF NOT EXISTS idx_tickets_inbox ON t_p4903350_kedoo_music_distribu.tickets(status, created_at, id);
+
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_tickets_user_created;
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_tickets_status;
@@ -0,0 +1,2 @@
+-- Выгрузка каталога артиста серверным курсором идёт по возрастанию id
+CREATE INDEX IF NOT EXISTS idx_releases_user_export ON t_p4903350_kedoo_music_distribu.releases(user_id, id) WHERE trash_status IS NULL;
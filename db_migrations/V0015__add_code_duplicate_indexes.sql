@@ -0,0 +1,18 @@
+-- Коды сравниваются в нормализованном виде: ISRC без дефисов и пробелов в верхнем регистре,
+-- UPC/EAN только цифрами без ведущих нулей (UPC-A и EAN-13 с нулём впереди совпадают)
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.normalize_isrc(code TEXT)
+RETURNS TEXT AS $$
+    SELECT NULLIF(upper(regexp_replace(code, '[^A-Za-z0-9]', '', 'g')), '')
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.normalize_upc(code TEXT)
+RETURNS TEXT AS $$
+    SELECT NULLIF(ltrim(regexp_replace(code, '[^0-9]', '', 'g'), '0'), '')
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE;
+
+CREATE INDEX IF NOT EXISTS idx_releases_upc_normalized ON t_p4903350_kedoo_music_distribu.releases(t_p4903350_kedoo_music_distribu.normalize_upc(upc)) WHERE trash_status IS NULL;
+CREATE INDEX IF NOT EXISTS idx_tracks_isrc_normalized ON t_p4903350_kedoo_music_distribu.tracks(t_p4903350_kedoo_music_distribu.normalize_isrc(isrc));
+
+-- Точный поиск по кодам теперь тоже идёт по нормализованным индексам
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_releases_upc;
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_tracks_isrc;
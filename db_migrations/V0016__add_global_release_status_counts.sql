@@ -0,0 +1,49 @@
+-- Строки с user_id = 0 хранят счётчики по всей платформе: модерации не нужно суммировать
+-- строки всех пользователей. Разность за оператор считается сразу для обоих уровней через
+-- GROUPING SETS, ключи обновляются в том же фиксированном порядке (общие строки первыми)
+CREATE OR REPLACE FUNCTION t_p4903350_kedoo_music_distribu.release_status_counts_trigger()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts AS c (user_id, status, in_trash, release_count)
+        SELECT CASE WHEN GROUPING(d.user_id) = 1 THEN 0 ELSE d.user_id END as counter_user_id, d.status, d.in_trash, sum(d.delta)
+        FROM (SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, 1 as delta FROM new_releases) d
+        GROUP BY GROUPING SETS ((d.user_id, d.status, d.in_trash), (d.status, d.in_trash))
+        HAVING sum(d.delta) <> 0
+        ORDER BY counter_user_id, d.status, d.in_trash
+        ON CONFLICT (user_id, status, in_trash) DO UPDATE SET release_count = c.release_count + EXCLUDED.release_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts AS c (user_id, status, in_trash, release_count)
+        SELECT CASE WHEN GROUPING(d.user_id) = 1 THEN 0 ELSE d.user_id END as counter_user_id, d.status, d.in_trash, sum(d.delta)
+        FROM (SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, -1 as delta FROM old_releases) d
+        GROUP BY GROUPING SETS ((d.user_id, d.status, d.in_trash), (d.status, d.in_trash))
+        HAVING sum(d.delta) <> 0
+        ORDER BY counter_user_id, d.status, d.in_trash
+        ON CONFLICT (user_id, status, in_trash) DO UPDATE SET release_count = c.release_count + EXCLUDED.release_count;
+    ELSE
+        INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts AS c (user_id, status, in_trash, release_count)
+        SELECT CASE WHEN GROUPING(d.user_id) = 1 THEN 0 ELSE d.user_id END as counter_user_id, d.status, d.in_trash, sum(d.delta)
+        FROM (SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, 1 as delta FROM new_releases
+              UNION ALL
+              SELECT user_id, COALESCE(status, 'draft') as status, trash_status IS NOT NULL as in_trash, -1 as delta FROM old_releases) d
+        GROUP BY GROUPING SETS ((d.user_id, d.status, d.in_trash), (d.status, d.in_trash))
+        HAVING sum(d.delta) <> 0
+        ORDER BY counter_user_id, d.status, d.in_trash
+        ON CONFLICT (user_id, status, in_trash) DO UPDATE SET release_count = c.release_count + EXCLUDED.release_count;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Заполнение общих строк под той же блокировкой, что и в V0010: функция уже заменена,
+-- поэтому изменения после снятия блокировки попадут в обе группы счётчиков
+LOCK TABLE t_p4903350_kedoo_music_distribu.releases IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM t_p4903350_kedoo_music_distribu.release_status_counts WHERE user_id = 0;
+INSERT INTO t_p4903350_kedoo_music_distribu.release_status_counts (user_id, status, in_trash, release_count)
+SELECT 0, COALESCE(status, 'draft'), trash_status IS NOT NULL, count(*)
+FROM t_p4903350_kedoo_music_distribu.releases
+GROUP BY COALESCE(status, 'draft'), trash_status IS NOT NULL;
+
+-- Общие счётчики читаются по первичному ключу, индекс по статусу больше не нужен
+DROP INDEX IF EXISTS t_p4903350_kedoo_music_distribu.idx_release_status_counts_status;